@@ -0,0 +1,272 @@
+"""
+Async LLM Request Scheduler
+---------------------------
+`asyncio.gather` sobre cientos de llamadas las lanza todas a la vez: el
+proveedor responde con 429 (rate limit) y el throughput se hunde. Este
+planificador se coloca delante de la API y:
+
+Firing hundreds of calls with `asyncio.gather` sends them all at once: the
+provider answers with 429 (rate limit) and throughput collapses. This
+scheduler sits in front of the API and:
+
+1. Respeta los límites de peticiones por minuto (RPM) y tokens por minuto
+   (TPM) con dos token buckets.
+   Honors requests-per-minute (RPM) and tokens-per-minute (TPM) limits with
+   two token buckets.
+2. Limita las llamadas en vuelo (concurrencia acotada).
+   Caps in-flight calls (bounded concurrency).
+3. Despacha por prioridad: las llamadas interactivas adelantan a los batch jobs.
+   Dispatches by priority: interactive calls jump ahead of batch jobs.
+4. Mide el tiempo en cola y el tiempo de servicio de cada prioridad.
+   Measures queue wait and service time per priority.
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import numpy as np
+
+# Menor valor = más prioridad / Lower value = higher priority
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+class TokenBucket:
+    """
+    Cubo que se rellena a `rate_per_minute` unidades por minuto hasta `capacity`.
+    Bucket refilled at `rate_per_minute` units per minute up to `capacity`.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self._last = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def time_until(self, amount: float) -> float:
+        """Segundos hasta que haya `amount` unidades / Seconds until `amount` units are available."""
+        self._refill()
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= amount
+
+class LLMScheduler:
+    """
+    Args:
+        rpm: Peticiones por minuto permitidas / Allowed requests per minute.
+        tpm: Tokens por minuto permitidos (prompt + respuesta estimados).
+            Allowed tokens per minute (estimated prompt + completion).
+        max_concurrency: Llamadas en vuelo como máximo / Maximum in-flight calls.
+        burst_seconds: Tamaño de los buckets en segundos de cuota; 60 = un minuto
+            entero de ráfaga, valores menores reparten la carga.
+            Bucket size in seconds of quota; 60 = a whole minute of burst,
+            smaller values spread the load.
+    """
+
+    def __init__(self, rpm: float, tpm: float, max_concurrency: int = 8,
+                 burst_seconds: float = 60.0):
+        # Con un bucket de menos de una petición, submit esperaría para siempre
+        # With a bucket smaller than one request, submit would wait forever
+        if rpm * burst_seconds / 60.0 < 1:
+            raise ValueError(f"The RPM bucket holds {rpm * burst_seconds / 60.0:.2f} requests "
+                             f"(rpm * burst_seconds / 60); it must hold at least 1")
+        self.requests = TokenBucket(rpm, rpm * burst_seconds / 60.0)
+        self.tokens = TokenBucket(tpm, tpm * burst_seconds / 60.0)
+        self.max_concurrency = max_concurrency
+        self._queue: list = []
+        self._counter = itertools.count()  # Desempate FIFO / FIFO tie-break
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._running: set = set()
+        self._wait: Dict[int, deque] = defaultdict(lambda: deque(maxlen=1000))
+        self._service: Dict[int, deque] = defaultdict(lambda: deque(maxlen=1000))
+        self.completed = 0
+        self.failed = 0
+
+    async def submit(self, call: Callable[..., Awaitable[Any]], *args,
+                     priority: int = PRIORITY_BATCH, tokens: int = 1, **kwargs) -> Any:
+        """
+        Encola `call(*args, **kwargs)` y devuelve su resultado cuando se ejecuta.
+        Queues `call(*args, **kwargs)` and returns its result once it has run.
+
+        Args:
+            tokens: Tokens estimados de la llamada (prompt + max_tokens).
+                Estimated tokens of the call (prompt + max_tokens).
+        """
+        if tokens > self.tokens.capacity:
+            raise ValueError(f"Request needs {tokens} tokens but the TPM bucket holds "
+                             f"{self.tokens.capacity:.0f}")
+        self._start()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._counter), time.monotonic(),
+                                     tokens, call, args, kwargs, future))
+        self._wakeup.set()
+        return await future
+
+    def _start(self):
+        # Primitivas creadas dentro del event loop en uso / Primitives created inside the running loop
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self):
+        while True:
+            await self._slots.acquire()
+            while True:
+                # Descarta las llamadas cuyo solicitante ya canceló
+                # Drop calls whose caller already cancelled
+                while self._queue and self._queue[0][-1].done():
+                    heapq.heappop(self._queue)
+                if not self._queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                tokens = self._queue[0][3]
+                delay = max(self.requests.time_until(1), self.tokens.time_until(tokens))
+                if delay <= 0:
+                    break
+                # Espera a la cuota, pero despierta si llega algo más prioritario
+                # Wait for quota, but wake up if something more urgent arrives
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+
+            priority, _, queued_at, tokens, call, args, kwargs, future = heapq.heappop(self._queue)
+            self.requests.consume(1)
+            self.tokens.consume(tokens)
+            self._wait[priority].append(time.monotonic() - queued_at)
+            task = asyncio.create_task(self._run(priority, call, args, kwargs, future))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, priority: int, call, args, kwargs, future: asyncio.Future):
+        start = time.monotonic()
+        try:
+            result = await call(*args, **kwargs)
+        except Exception as e:
+            self.failed += 1
+            if not future.done():
+                future.set_exception(e)
+        else:
+            self.completed += 1
+            if not future.done():
+                future.set_result(result)
+        finally:
+            self._service[priority].append(time.monotonic() - start)
+            self._slots.release()
+
+    async def aclose(self):
+        """
+        Detiene el despachador tras esperar las llamadas en vuelo; las que siguen
+        en cola fallan con RuntimeError.
+        Stops the dispatcher after in-flight calls; calls still queued fail with
+        RuntimeError.
+        """
+        while self._queue:
+            future = heapq.heappop(self._queue)[-1]
+            if not future.done():
+                future.set_exception(RuntimeError("Scheduler closed before the call was dispatched"))
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+
+    def stats(self) -> Dict:
+        """
+        Espera en cola y tiempo de servicio (ms) por prioridad / Queue wait and service time (ms) per priority.
+        """
+        by_priority = {}
+        for priority in sorted(self._wait):
+            wait = np.array(self._wait[priority]) * 1000
+            service = np.array(self._service[priority] or [0.0]) * 1000
+            by_priority[priority] = {
+                "count": len(wait),
+                "wait_p50_ms": float(np.percentile(wait, 50)),
+                "wait_p95_ms": float(np.percentile(wait, 95)),
+                "service_p50_ms": float(np.percentile(service, 50)),
+            }
+        return {"queued": len(self._queue), "in_flight": len(self._running),
+                "completed": self.completed, "failed": self.failed, "by_priority": by_priority}
+
+# Proveedor simulado para la demo y los tests / Simulated provider for the demo and tests
+class RateLimitError(Exception):
+    """HTTP 429 simulado / Simulated HTTP 429."""
+
+class SimulatedProvider:
+    """
+    Proveedor simulado como `mock_llm_call` de async_llm.py, pero con límite
+    de RPM: las peticiones por encima del límite reciben un 429.
+    Simulated provider like `mock_llm_call` in async_llm.py, but with an
+    RPM limit: requests above the limit get a 429.
+    """
+
+    def __init__(self, rpm: int):
+        # Cuota con un segundo de ráfaga, como hacen los proveedores reales
+        # Quota with one second of burst, as real providers do
+        self._quota = TokenBucket(rpm, capacity=rpm / 60)
+        self.rate_limited = 0
+
+    async def complete(self, prompt_id: int) -> str:
+        if self._quota.time_until(1) > 0:
+            self.rate_limited += 1
+            raise RateLimitError(f"429 for request {prompt_id}")
+        self._quota.consume(1)
+        await asyncio.sleep(random.uniform(0.05, 0.15))
+        return f"Response for {prompt_id}"
+
+if __name__ == "__main__":
+    async def main_unscheduled():
+        print("\n--- asyncio.gather sin control / Uncontrolled asyncio.gather ---")
+        provider = SimulatedProvider(rpm=3000)
+        results = await asyncio.gather(*(provider.complete(i) for i in range(100)),
+                                       return_exceptions=True)
+        errors = sum(isinstance(result, Exception) for result in results)
+        print(f"❌ {errors} of {len(results)} requests got a 429")
+
+    async def main_scheduled():
+        print("\n--- Con LLMScheduler / With LLMScheduler ---")
+        provider = SimulatedProvider(rpm=3000)
+        # Un 10 % por debajo del límite del proveedor / 10 % below the provider's limit
+        scheduler = LLMScheduler(rpm=2700, tpm=3_000_000, max_concurrency=10, burst_seconds=1)
+
+        async def interactive_user():
+            # Llegan mientras el batch job ya está encolado / They arrive while the batch job is queued
+            await asyncio.sleep(0.3)
+            return await asyncio.gather(*(scheduler.submit(provider.complete, 1000 + i,
+                                                           priority=PRIORITY_INTERACTIVE, tokens=500)
+                                          for i in range(5)))
+
+        start = time.perf_counter()
+        batch = asyncio.gather(*(scheduler.submit(provider.complete, i, tokens=1000)
+                                 for i in range(100)))
+        await asyncio.gather(batch, interactive_user())
+        await scheduler.aclose()
+        print(f"✅ 105 requests in {time.perf_counter() - start:.2f}s, "
+              f"{provider.rate_limited} got a 429")
+        for priority, metrics in scheduler.stats()["by_priority"].items():
+            name = "interactive" if priority == PRIORITY_INTERACTIVE else "batch"
+            print(f"📊 {name:<11} n={metrics['count']:<3} wait p50 {metrics['wait_p50_ms']:7.1f} ms "
+                  f"p95 {metrics['wait_p95_ms']:7.1f} ms  service p50 {metrics['service_p50_ms']:.1f} ms")
+
+    asyncio.run(main_unscheduled())
+    asyncio.run(main_scheduled())
@@ -0,0 +1,183 @@
+"""
+MinHash Near-Duplicate Removal
+------------------------------
+Elimina documentos casi duplicados (páginas con plantilla, versiones
+re-exportadas) antes de calcular embeddings, para no pagar dos veces por el
+mismo contenido ni inflar el índice.
+Removes near-duplicate documents (templated pages, re-exported versions)
+before computing embeddings, so the same content is not paid for twice nor
+indexed twice.
+
+1. Shingles: grupos de `shingle_size` palabras consecutivas, hasheados con
+   pandas sobre la columna completa.
+   Groups of `shingle_size` consecutive words, hashed with pandas over the
+   whole column.
+2. MinHash: `num_perm` funciones hash; la firma de un documento es el mínimo
+   de cada una. P(firma_a[j] == firma_b[j]) = Jaccard(a, b).
+   `num_perm` hash functions; a document's signature is the minimum of each.
+3. LSH banding: la firma se parte en bandas; dos documentos con una banda
+   idéntica son candidatos y se verifican con la similitud estimada.
+   The signature is split into bands; two documents with an identical band
+   are candidates and are verified with the estimated similarity.
+
+Todo es lineal en el número de filas: no se compara cada par de documentos.
+Everything is linear in the number of rows: documents are never compared pairwise.
+"""
+
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+_MIX = np.uint64(0x9E3779B97F4A7C15)  # Constante de mezcla (golden ratio) / Mixing constant
+
+def _shingle_hashes(texts: pd.Series, shingle_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Hashes (uint64) de los shingles y la fila de cada uno, ordenados por fila.
+    Shingle hashes (uint64) and the row of each one, sorted by row.
+    """
+    tokens = texts.reset_index(drop=True).fillna("").str.lower().str.findall(r"\w+").explode().dropna()
+    rows = tokens.index.to_numpy()
+    hashes = pd.util.hash_array(tokens.to_numpy(dtype=object))
+    if len(rows) < shingle_size:
+        return hashes, rows
+
+    # Shingle i = tokens [i, i + shingle_size) si todos son de la misma fila
+    # Shingle i = tokens [i, i + shingle_size) if they all belong to the same row
+    n = len(rows) - shingle_size + 1
+    valid = rows[:n] == rows[shingle_size - 1:]
+    shingles = hashes[:n].copy()
+    for offset in range(1, shingle_size):
+        shingles = shingles * _MIX + hashes[offset:offset + n]
+
+    # Textos más cortos que un shingle: se usan sus palabras sueltas
+    # Texts shorter than one shingle: their single words are used
+    short = ~np.isin(rows, rows[:n][valid])
+    all_rows = np.concatenate((rows[:n][valid], rows[short]))
+    all_hashes = np.concatenate((shingles[valid], hashes[short]))
+    order = np.argsort(all_rows, kind="stable")
+    return all_hashes[order], all_rows[order]
+
+def minhash_signatures(texts: pd.Series, num_perm: int = 128, shingle_size: int = 3,
+                       seed: int = 0, block_size: int = 10_000) -> np.ndarray:
+    """
+    Firmas MinHash (n_textos, num_perm) en uint32 (4 * num_perm bytes por fila).
+    Se procesan `block_size` filas cada vez para acotar la memoria.
+    MinHash signatures (n_texts, num_perm) as uint32 (4 * num_perm bytes per
+    row). `block_size` rows are processed at a time to bound memory.
+    """
+    rng = np.random.default_rng(seed)
+    # Hash universal multiply-shift: ((a * x + b) mod 2^64) >> 32, con `a` impar
+    # Multiply-shift universal hashing: ((a * x + b) mod 2^64) >> 32, with odd `a`
+    a = rng.integers(1, 2**63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    b = rng.integers(0, 2**63, num_perm, dtype=np.uint64)
+
+    # Filas sin shingles (texto vacío) quedan con el valor máximo
+    # Rows without shingles (empty text) keep the maximum value
+    signatures = np.full((len(texts), num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+    for start in range(0, len(texts), block_size):
+        hashes, rows = _shingle_hashes(texts.iloc[start:start + block_size], shingle_size)
+        if len(rows) == 0:
+            continue
+        present, starts = np.unique(rows, return_index=True)
+        # Por grupos de permutaciones: (perms, shingles) contiguo por fila, memoria acotada
+        # In groups of permutations: (perms, shingles) contiguous per row, bounded memory
+        for j in range(0, num_perm, 16):
+            values = ((a[j:j + 16, None] * hashes + b[j:j + 16, None]) >> np.uint64(32))
+            minima = np.minimum.reduceat(values.astype(np.uint32), starts, axis=1)
+            signatures[start + present, j:j + 16] = minima.T
+    return signatures
+
+def choose_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    (bandas, filas por banda) cuyo umbral de la curva S, (1/b)^(1/r), queda
+    más cerca de `threshold` sin superarlo (mejor algún candidato de más que perder duplicados).
+    (bands, rows per band) whose S-curve threshold, (1/b)^(1/r), is closest
+    to `threshold` without exceeding it (better a few extra candidates than missed duplicates).
+    """
+    options = [(num_perm // r, r) for r in range(1, num_perm + 1) if num_perm % r == 0]
+    below = [(b, r) for b, r in options if (1 / b) ** (1 / r) <= threshold] or options[:1]
+    return min(below, key=lambda br: threshold - (1 / br[0]) ** (1 / br[1]))
+
+def near_duplicate_mask(signatures: np.ndarray, threshold: float = 0.8,
+                        bands: Optional[int] = None) -> np.ndarray:
+    """
+    True para cada fila que es casi duplicada de una fila anterior (la primera
+    aparición siempre se conserva).
+    True for every row that is a near-duplicate of an earlier row (the first
+    occurrence is always kept).
+    """
+    n, num_perm = signatures.shape
+    if bands is None:
+        bands, rows_per_band = choose_bands(num_perm, threshold)
+    else:
+        rows_per_band = num_perm // bands
+    duplicate = np.zeros(n, dtype=bool)
+    if n == 0:
+        return duplicate
+
+    for band in range(bands):
+        block = signatures[:, band * rows_per_band:(band + 1) * rows_per_band].astype(np.uint64)
+        keys = np.zeros(n, dtype=np.uint64)
+        for column in block.T:
+            keys = keys * _MIX + column
+        # Orden estable: el líder de cada bucket es su fila más antigua
+        # Stable sort: each bucket's leader is its oldest row
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        new_bucket = np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1]))
+        leaders = order[np.flatnonzero(new_bucket)[np.cumsum(new_bucket) - 1]]
+
+        candidates = order[leaders != order]
+        if len(candidates) == 0:
+            continue
+        leader_of = leaders[leaders != order]
+        # Verificación: similitud estimada = fracción de minhashes iguales
+        # Verification: estimated similarity = fraction of equal minhashes
+        similarity = (signatures[candidates] == signatures[leader_of]).mean(axis=1)
+        duplicate[candidates[similarity >= threshold]] = True
+    return duplicate
+
+def drop_near_duplicates(df: pd.DataFrame, text_column: str = 'text_chunk',
+                         threshold: float = 0.8, num_perm: int = 128, shingle_size: int = 3,
+                         seed: int = 0) -> Tuple[pd.DataFrame, Dict]:
+    """
+    Devuelve `df` sin casi duplicados (Jaccard estimado >= `threshold`) y un informe.
+    Returns `df` without near-duplicates (estimated Jaccard >= `threshold`) and a report.
+    """
+    start = time.perf_counter()
+    signatures = minhash_signatures(df[text_column], num_perm, shingle_size, seed)
+    bands, rows_per_band = choose_bands(num_perm, threshold)
+    duplicate = near_duplicate_mask(signatures, threshold, bands)
+    report = {
+        "rows": len(df),
+        "dropped": int(duplicate.sum()),
+        "kept": int(len(df) - duplicate.sum()),
+        "threshold": threshold,
+        "bands": bands,
+        "rows_per_band": rows_per_band,
+        "seconds": time.perf_counter() - start,
+    }
+    return df[~duplicate], report
+
+if __name__ == "__main__":
+    # Volcado con páginas de plantilla y re-exportaciones
+    # Dump with templated pages and re-exported versions
+    rng = np.random.default_rng(0)
+    vocabulary = np.array([f"word{i}" for i in range(5000)])
+    originals = [" ".join(rng.choice(vocabulary, 80)) for _ in range(2000)]
+    texts = list(originals)
+    for i in range(1000):
+        # Re-exportación: el mismo texto con una palabra cambiada
+        # Re-export: the same text with one word changed
+        words = originals[i].split()
+        words[rng.integers(len(words))] = "edited"
+        texts.append(" ".join(words))
+    df = pd.DataFrame({"id": range(len(texts)), "text_chunk": texts})
+
+    print("--- MinHash + LSH deduplication ---")
+    deduped, report = drop_near_duplicates(df, threshold=0.8)
+    print(f"Rows: {report['rows']} -> {report['kept']} "
+          f"(dropped {report['dropped']} near-duplicates in {report['seconds']:.2f}s)")
+    print(f"LSH: {report['bands']} bands x {report['rows_per_band']} rows")
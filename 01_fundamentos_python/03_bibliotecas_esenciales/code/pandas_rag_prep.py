@@ -5,8 +5,17 @@ Uso de Pandas para preparar datos textuales antes de la vectorización.
 Using Pandas to prepare textual data before vectorization.
 """
 
+import numpy as np
 import pandas as pd
 import io
+import os
+import tempfile
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
 
 # Simulación de un archivo CSV cargado / Simulated CSV file
 csv_data = """id,title,content,category
@@ -16,6 +25,119 @@ csv_data = """id,title,content,category
 4,Quantum Physics,Particles behave differently...,Science
 """
 
+def build_text_chunks(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Limpia un bloque y añade 'text_chunk' con operaciones vectorizadas (sin bucles por fila).
+    Cleans a block and adds 'text_chunk' with vectorized ops (no per-row loops).
+    """
+    # .assign devuelve un DataFrame nuevo: nada de asignar sobre un slice
+    # (evita el SettingWithCopyWarning)
+    # .assign returns a new DataFrame: no assignment on a slice
+    # (avoids the SettingWithCopyWarning)
+    return (df.dropna(subset=['title', 'content'])
+              .assign(text_chunk=lambda d: "Title: " + d['title'] + "\nContent: " + d['content']))
+
+def stream_dataset_for_rag(source: Union[str, io.StringIO], chunksize: int = 100_000
+                           ) -> Iterator[List[Dict]]:
+    """
+    Versión en streaming para CSVs de decenas de GB: lee `chunksize` filas cada
+    vez y produce lotes de registros {"id", "text", "metadata"} listos para la
+    etapa de embeddings. La memoria depende de `chunksize`, no del tamaño del fichero.
+    Streaming version for CSVs of tens of GB: reads `chunksize` rows at a time
+    and yields batches of {"id", "text", "metadata"} records ready for the
+    embedding stage. Memory depends on `chunksize`, not on the file size.
+    """
+    # dtype=str: el mismo tipo en todos los bloques (sin inferencia bloque a bloque)
+    # dtype=str: same types in every block (no per-block inference)
+    reader = pd.read_csv(source, chunksize=chunksize, dtype=str,
+                         usecols=['id', 'title', 'content', 'category'])
+    for block in reader:
+        block = build_text_chunks(block).assign(category=lambda d: d['category'].fillna(""))
+        yield [{"id": doc_id, "text": text, "metadata": {"category": category}}
+               for doc_id, text, category in zip(block['id'], block['text_chunk'], block['category'])]
+
+def chunk_by_tokens(df: pd.DataFrame, max_tokens: int = 256, overlap: int = 32,
+                    text_column: str = 'text_chunk', id_column: str = 'id',
+                    tokenizer: Optional[Any] = None) -> pd.DataFrame:
+    """
+    Parte cada texto en ventanas de `max_tokens` tokens que se solapan
+    `overlap` tokens. Las ventanas de todas las filas se calculan a la vez
+    con aritmética de arrays (sin bucles por fila); solo el texto final de
+    cada chunk se une en Python.
+    Splits every text into windows of `max_tokens` tokens overlapping by
+    `overlap` tokens. Windows for all rows are computed at once with array
+    arithmetic (no per-row loops); only each chunk's final text is joined in
+    Python.
+
+    Args:
+        tokenizer: Objeto con `encode`/`decode` (p. ej.
+            `tiktoken.encoding_for_model("text-embedding-3-small")`): los
+            tokens son los del modelo y `max_tokens` es un límite real. Sin él,
+            los tokens son palabras separadas por espacios y, para modelos de
+            OpenAI, 1 palabra ≈ 1.3 tokens: usa max_tokens ≈ límite / 1.3.
+            Object with `encode`/`decode` (e.g.
+            `tiktoken.encoding_for_model("text-embedding-3-small")`): tokens
+            are the model's own and `max_tokens` is a real limit. Without it,
+            tokens are whitespace-separated words and, for OpenAI models,
+            1 word ≈ 1.3 tokens: use max_tokens ≈ limit / 1.3.
+
+    Returns:
+        DataFrame [id, chunk_index, start_token, end_token, text]; las
+        posiciones [start_token, end_token) son relativas al texto original.
+        Positions [start_token, end_token) are relative to the source text.
+    """
+    if not 0 <= overlap < max_tokens:
+        raise ValueError("overlap must satisfy 0 <= overlap < max_tokens")
+    stride = max_tokens - overlap
+
+    texts = df[text_column].fillna("")
+    if tokenizer is None:
+        token_lists = texts.str.split().to_numpy()
+        join = " ".join
+    else:
+        encode_batch = getattr(tokenizer, "encode_batch", None)  # tiktoken: en paralelo / in parallel
+        token_lists = (encode_batch(texts.tolist()) if encode_batch is not None
+                       else [tokenizer.encode(text) for text in texts])
+        join = tokenizer.decode
+    n_tokens = np.fromiter(map(len, token_lists), dtype=np.int64, count=len(token_lists))
+    # Ventanas por fila: la última empieza a menos de max_tokens del final
+    # Windows per row: the last one starts less than max_tokens from the end
+    n_windows = np.where(n_tokens > 0, 1 + np.maximum(0, -(-(n_tokens - max_tokens) // stride)), 0)
+
+    # Una entrada por chunk: fila de origen, índice dentro de la fila y rango de tokens
+    # One entry per chunk: source row, index within the row and token range
+    rows = np.repeat(np.arange(len(df)), n_windows)
+    chunk_index = np.arange(len(rows)) - np.repeat(np.cumsum(n_windows) - n_windows, n_windows)
+    start = chunk_index * stride
+    end = np.minimum(start + max_tokens, n_tokens[rows])
+
+    chunk_texts = [join(token_lists[row][s:e])
+                   for row, s, e in zip(rows.tolist(), start.tolist(), end.tolist())]
+    return pd.DataFrame({"id": df[id_column].to_numpy()[rows], "chunk_index": chunk_index,
+                         "start_token": start, "end_token": end, "text": chunk_texts})
+
+def write_chunks_parquet(chunks: pd.DataFrame, path: str):
+    """
+    Guarda los chunks en Parquet (columnar): la etapa de embeddings lee solo
+    las columnas que necesita, sin volver a parsear el CSV.
+    Saves the chunks as Parquet (columnar): the embedding stage reads only the
+    columns it needs, without re-parsing the CSV.
+    """
+    if pq is None:
+        raise ImportError("Instala pyarrow: pip install pyarrow")
+    chunks.to_parquet(path, index=False)
+
+def iter_chunk_batches(path: str, batch_size: int = 10_000,
+                       columns: Sequence[str] = ('id', 'chunk_index', 'text')):
+    """
+    Lee el Parquet por lotes de columnas (Arrow RecordBatch) con memory-mapping.
+    Reads the Parquet file as column batches (Arrow RecordBatch) with memory-mapping.
+    """
+    if pq is None:
+        raise ImportError("Instala pyarrow: pip install pyarrow")
+    parquet_file = pq.ParquetFile(path, memory_map=True)
+    yield from parquet_file.iter_batches(batch_size=batch_size, columns=list(columns))
+
 def prepare_dataset_for_rag():
     print("--- Carga de Datos / Data Loading ---")
     # Leer CSV desde string (simulando archivo)
@@ -31,7 +153,7 @@ def prepare_dataset_for_rag():
     print("\n--- Transformación / Transformation ---")
     # 2. Crear un campo 'text_chunk' que combine título y contenido
     # Esto es lo que realmente se vectorizará
-    df_clean['text_chunk'] = "Title: " + df_clean['title'] + "\nContent: " + df_clean['content']
+    df_clean = build_text_chunks(df_clean)
     
     # Mostrar un ejemplo de chunk
     print("Example Chunk:")
@@ -45,3 +167,23 @@ def prepare_dataset_for_rag():
 
 if __name__ == "__main__":
     prepare_dataset_for_rag()
+
+    print("\n--- Streaming (chunksize=2) ---")
+    # Con un fichero real / With a real file: stream_dataset_for_rag("export.csv", chunksize=100_000)
+    for i, batch in enumerate(stream_dataset_for_rag(io.StringIO(csv_data), chunksize=2)):
+        print(f"Batch {i}: {[record['id'] for record in batch]}")
+
+    print("\n--- Chunking por tokens / Token chunking (max_tokens=4, overlap=1) ---")
+    df = build_text_chunks(pd.read_csv(io.StringIO(csv_data), dtype=str))
+    chunks = chunk_by_tokens(df, max_tokens=4, overlap=1)
+    print(chunks.head(6).to_string(index=False))
+
+    if pq is None:
+        print("❌ pyarrow not installed. Run: pip install pyarrow")
+    else:
+        path = os.path.join(tempfile.mkdtemp(), "chunks.parquet")
+        write_chunks_parquet(chunks, path)
+        for batch in iter_chunk_batches(path, batch_size=4, columns=["id", "text"]):
+            # Columna de textos lista para el modelo de embeddings
+            # Text column ready for the embedding model
+            print(f"Parquet batch: {batch.num_rows} chunks, ids {batch.column('id').to_pylist()}")
@@ -0,0 +1,334 @@
+"""
+Adaptive Retries: Circuit Breaker + Retry Budget
+------------------------------------------------
+Reintentar a ciegas (3 intentos con backoff exponencial) multiplica la carga
+justo cuando el proveedor está caído: cada worker envía hasta 3 veces más
+peticiones. `RetryPolicy` combina tres defensas:
+
+Blind retries (3 attempts with exponential backoff) multiply the load exactly
+when the provider is down: every worker sends up to 3 times more requests.
+`RetryPolicy` combines three defenses:
+
+1. Full jitter: espera aleatoria en [0, min(max_delay, base * 2^intento)],
+   para que los workers no reintenten sincronizados.
+   Random wait in [0, min(max_delay, base * 2^attempt)], so workers do not
+   retry in lockstep.
+2. Retry budget: los reintentos no pueden superar una fracción de las llamadas
+   con éxito recientes (global, compartido por todos los workers).
+   Retries cannot exceed a fraction of recent successful calls (global,
+   shared by every worker).
+3. Circuit breaker: tras N fallos seguidos se deja de llamar (open); pasado un
+   tiempo se dejan pasar llamadas de prueba (half-open) y, si van bien, se cierra.
+   After N consecutive failures calls stop (open); after a while probe calls
+   are let through (half-open) and, if they succeed, it closes again.
+
+Funciona con funciones normales y con corrutinas (asyncio).
+Works with plain functions and with coroutines (asyncio).
+"""
+
+import asyncio
+import functools
+import inspect
+import random
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple, Type
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+class CircuitOpenError(Exception):
+    """El circuito está abierto: la llamada no se hizo / The circuit is open: the call was not made."""
+
+class CircuitBreaker:
+    """
+    Args:
+        failure_threshold: Fallos consecutivos que abren el circuito.
+            Consecutive failures that open the circuit.
+        recovery_timeout: Segundos en `open` antes de probar (half-open).
+            Seconds in `open` before probing (half-open).
+        half_open_max_calls: Llamadas de prueba simultáneas en half-open.
+            Simultaneous probe calls while half-open.
+    """
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0,
+                 half_open_max_calls: int = 1):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        self.transitions: Counter = Counter()  # "closed->open" -> veces / times
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str):
+        self.transitions[f"{self.state}->{state}"] += 1
+        self.state = state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                self._transition(HALF_OPEN)
+                self._probes = 0
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            if self.state == HALF_OPEN:
+                self._transition(CLOSED)
+
+    def release_probe(self):
+        """
+        Devuelve el hueco de una prueba que no terminó (p. ej. CancelledError al
+        perder un hedge); si no, half-open se quedaría sin pruebas para siempre.
+        Returns the slot of a probe that did not finish (e.g. CancelledError
+        after losing a hedge); otherwise half-open would run out of probes forever.
+        """
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            # Una prueba fallida en half-open vuelve a abrir / A failed half-open probe reopens
+            if self.state == HALF_OPEN or (self.state == CLOSED
+                                           and self._failures >= self.failure_threshold):
+                self._transition(OPEN)
+                self._opened_at = time.monotonic()
+
+class RetryBudget:
+    """
+    Permite reintentos mientras, en los últimos `window` segundos,
+    reintentos < min_retries + ratio * éxitos.
+    Allows retries while, over the last `window` seconds,
+    retries < min_retries + ratio * successes.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 10, window: float = 10.0):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._successes: deque = deque()
+        self._retries: deque = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float):
+        for events in (self._successes, self._retries):
+            while events and now - events[0] > self.window:
+                events.popleft()
+
+    def record_success(self):
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            self._successes.append(now)
+
+    def try_retry(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            if len(self._retries) >= self.min_retries + self.ratio * len(self._successes):
+                return False
+            self._retries.append(now)
+            return True
+
+class RetryPolicy:
+    """
+    Se usa como decorador (`@policy`) o con `call` / `acall`.
+    Used as a decorator (`@policy`) or through `call` / `acall`.
+
+    Args:
+        retry_on: Excepciones transitorias; solo estas se reintentan y cuentan
+            como fallo para el circuit breaker.
+            Transient exceptions; only these are retried and count as a
+            failure for the circuit breaker.
+        breaker / budget: Compartirlos entre políticas hace que todas las
+            llamadas al mismo proveedor se protejan juntas.
+            Sharing them across policies protects every call to the same
+            provider together.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 1.0, max_delay: float = 10.0,
+                 retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+                 breaker: Optional[CircuitBreaker] = None, budget: Optional[RetryBudget] = None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on = retry_on
+        self.breaker = breaker
+        self.budget = budget
+        self.counters: Counter = Counter()
+
+    def __call__(self, fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                return await self.acall(fn, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return self.call(fn, *args, **kwargs)
+        return wrapper
+
+    def _delay(self, attempt: int) -> float:
+        # Full jitter (AWS Architecture Blog, "Exponential Backoff And Jitter")
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _before_attempt(self):
+        if self.breaker is not None and not self.breaker.allow():
+            self.counters["short_circuited"] += 1
+            raise CircuitOpenError("Circuit open: call not attempted")
+        self.counters["attempts"] += 1
+
+    def _on_success(self):
+        self.counters["successes"] += 1
+        if self.breaker is not None:
+            self.breaker.record_success()
+        if self.budget is not None:
+            self.budget.record_success()
+
+    def _should_retry(self, attempt: int) -> bool:
+        # Se llama tras un fallo transitorio / Called after a transient failure
+        self.counters["failures"] += 1
+        if self.breaker is not None:
+            self.breaker.record_failure()
+        if attempt + 1 >= self.max_attempts:
+            return False
+        if self.budget is not None and not self.budget.try_retry():
+            self.counters["budget_exhausted"] += 1
+            return False
+        self.counters["retries"] += 1
+        return True
+
+    def _on_other_error(self):
+        # Un error no transitorio (p. ej. 400) significa que el proveedor responde
+        # A non-transient error (e.g. 400) means the provider is answering
+        if self.breaker is not None:
+            self.breaker.record_success()
+
+    def _on_abort(self):
+        # Cancelación o KeyboardInterrupt: no dice nada del proveedor
+        # Cancellation or KeyboardInterrupt: says nothing about the provider
+        if self.breaker is not None:
+            self.breaker.release_probe()
+
+    def call(self, fn: Callable, *args, **kwargs):
+        for attempt in range(self.max_attempts):
+            self._before_attempt()
+            try:
+                result = fn(*args, **kwargs)
+            except self.retry_on:
+                if not self._should_retry(attempt):
+                    raise
+                time.sleep(self._delay(attempt))
+            except Exception:
+                self._on_other_error()
+                raise
+            except BaseException:
+                self._on_abort()
+                raise
+            else:
+                self._on_success()
+                return result
+
+    async def acall(self, fn: Callable, *args, **kwargs):
+        for attempt in range(self.max_attempts):
+            self._before_attempt()
+            try:
+                result = await fn(*args, **kwargs)
+            except self.retry_on:
+                if not self._should_retry(attempt):
+                    raise
+                await asyncio.sleep(self._delay(attempt))
+            except Exception:
+                self._on_other_error()
+                raise
+            except BaseException:
+                self._on_abort()
+                raise
+            else:
+                self._on_success()
+                return result
+
+    def metrics(self) -> Dict:
+        """
+        Contadores de la política y transiciones del circuit breaker.
+        Policy counters and circuit breaker transitions.
+        """
+        metrics = dict(self.counters)
+        if self.breaker is not None:
+            metrics["breaker_state"] = self.breaker.state
+            metrics["breaker_transitions"] = dict(self.breaker.transitions)
+        return metrics
+
+if __name__ == "__main__":
+    class APIError(Exception):
+        pass
+
+    class FlakyProvider:
+        """
+        Proveedor con una caída entre `outage` segundos / Provider with an outage between `outage` seconds.
+        """
+
+        def __init__(self, outage: Tuple[float, float]):
+            self.start = time.monotonic()
+            self.outage = outage
+            self.requests = 0
+
+        def call(self) -> str:
+            self.requests += 1
+            elapsed = time.monotonic() - self.start
+            time.sleep(0.01)
+            if self.outage[0] <= elapsed < self.outage[1] or random.random() < 0.05:
+                raise APIError("503 Service Unavailable")
+            return "ok"
+
+    def run(policy: RetryPolicy, label: str, requests: int = 400):
+        provider = FlakyProvider(outage=(0.5, 1.2))
+
+        def worker(i):
+            # Llega una petición cada 5 ms / One request arrives every 5 ms
+            time.sleep(max(0.0, provider.start + 0.005 * i - time.monotonic()))
+            try:
+                return policy.call(provider.call)
+            except (APIError, CircuitOpenError) as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            results = list(pool.map(worker, range(requests)))
+        ok = sum(result == "ok" for result in results)
+        print(f"{label:<22} {ok:>3}/{requests} ok, {provider.requests:>4} upstream requests "
+              f"({provider.requests / requests:.2f}x)")
+        return policy
+
+    print("--- Outage simulation: 2 s of traffic, provider down for 0.7 s ---")
+    run(RetryPolicy(max_attempts=3, base_delay=0.05, retry_on=(APIError,)), "🔁 Blind retries")
+    policy = run(RetryPolicy(max_attempts=3, base_delay=0.05, retry_on=(APIError,),
+                             breaker=CircuitBreaker(failure_threshold=5, recovery_timeout=0.2),
+                             budget=RetryBudget(ratio=0.2, min_retries=5, window=1.0)),
+                 "🛡️  Breaker + budget")
+    print(f"📊 {policy.metrics()}")
+
+    print("\n--- Asyncio ---")
+    attempts = 0
+
+    @RetryPolicy(max_attempts=4, base_delay=0.01, retry_on=(APIError,))
+    async def flaky_async_call() -> str:
+        global attempts
+        attempts += 1
+        if attempts < 3:
+            raise APIError("Server Busy")
+        return "Data received"
+
+    print(f"✅ {asyncio.run(flaky_async_call())} after {attempts} attempts")
@@ -11,6 +11,8 @@ from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_excep
 import random
 import time
 
+from resilience import CircuitBreaker, CircuitOpenError, RetryBudget, RetryPolicy
+
 # Definir una excepción personalizada para simular errores de API
 class APIError(Exception):
     pass
@@ -37,6 +39,21 @@ def call_unstable_api():
     print("✅ API Success!")
     return "Data received"
 
+# Variante adaptativa para producción (ver resilience.py): full jitter, un
+# presupuesto global de reintentos y un circuit breaker compartido. Durante una
+# caída deja de enviar peticiones en vez de multiplicarlas por 3.
+# Adaptive production variant (see resilience.py): full jitter, a global retry
+# budget and a shared circuit breaker. During an outage it stops sending
+# requests instead of multiplying them by 3.
+api_policy = RetryPolicy(
+    max_attempts=3, base_delay=1, max_delay=10, retry_on=(APIError,),
+    breaker=CircuitBreaker(failure_threshold=5, recovery_timeout=30),
+    budget=RetryBudget(ratio=0.2, min_retries=10),
+)
+# __wrapped__ es la función original, sin el decorador de tenacity
+# __wrapped__ is the original function, without the tenacity decorator
+call_unstable_api_guarded = api_policy(call_unstable_api.__wrapped__)
+
 if __name__ == "__main__":
     try:
         print("--- Iniciando llamadas con reintentos / Starting calls with retries ---")
@@ -44,3 +61,13 @@ if __name__ == "__main__":
         print(f"Final Result: {result}")
     except Exception as e:
         print(f"💀 Failed after retries: {e}")
+
+    print("\n--- Circuit breaker + retry budget ---")
+    for _ in range(5):
+        try:
+            print(f"Final Result: {call_unstable_api_guarded()}")
+        except CircuitOpenError as e:
+            print(f"🚧 {e}")
+        except APIError as e:
+            print(f"💀 Failed after retries: {e}")
+    print(f"📊 Metrics: {api_policy.metrics()}")
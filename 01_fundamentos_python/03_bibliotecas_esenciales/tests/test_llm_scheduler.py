@@ -0,0 +1,130 @@
+import asyncio
+import time
+
+import pytest
+
+from llm_scheduler import (PRIORITY_BATCH, PRIORITY_INTERACTIVE, LLMScheduler, RateLimitError,
+                           SimulatedProvider)
+
+def test_interactive_calls_jump_ahead_of_queued_batch_calls():
+    order = []
+
+    async def call(name, delay=0.0):
+        await asyncio.sleep(delay)
+        order.append(name)
+        return name
+
+    async def main():
+        scheduler = LLMScheduler(rpm=60_000, tpm=1_000_000, max_concurrency=1)
+        blocker = asyncio.ensure_future(scheduler.submit(call, "blocker", 0.05))
+        await asyncio.sleep(0.01)
+        batch = [asyncio.ensure_future(scheduler.submit(call, f"batch-{i}", priority=PRIORITY_BATCH))
+                 for i in range(3)]
+        await asyncio.sleep(0)
+        interactive = scheduler.submit(call, "interactive", priority=PRIORITY_INTERACTIVE)
+        results = await asyncio.gather(blocker, *batch, interactive)
+        await scheduler.aclose()
+        return results
+
+    results = asyncio.run(main())
+    assert results == ["blocker", "batch-0", "batch-1", "batch-2", "interactive"]
+    assert order == ["blocker", "interactive", "batch-0", "batch-1", "batch-2"]
+
+def test_rpm_bucket_paces_requests():
+    async def call():
+        return time.monotonic()
+
+    async def main():
+        # 10 peticiones de ráfaga y luego 10 por segundo / 10 burst requests, then 10 per second
+        scheduler = LLMScheduler(rpm=600, tpm=1_000_000, max_concurrency=20, burst_seconds=1)
+        start = time.monotonic()
+        times = await asyncio.gather(*(scheduler.submit(call) for _ in range(15)))
+        await scheduler.aclose()
+        return [t - start for t in times]
+
+    times = sorted(asyncio.run(main()))
+    assert times[9] < 0.1
+    assert times[-1] >= 0.4
+
+def test_max_concurrency_is_respected():
+    in_flight = peak = 0
+
+    async def call():
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+
+    async def main():
+        scheduler = LLMScheduler(rpm=60_000, tpm=1_000_000, max_concurrency=3)
+        await asyncio.gather(*(scheduler.submit(call) for _ in range(12)))
+        await scheduler.aclose()
+        return scheduler.stats()
+
+    stats = asyncio.run(main())
+    assert peak == 3
+    assert stats["completed"] == 12
+
+def test_call_exceptions_reach_the_caller():
+    async def call():
+        raise KeyError("boom")
+
+    async def main():
+        scheduler = LLMScheduler(rpm=60_000, tpm=1_000_000)
+        with pytest.raises(KeyError):
+            await scheduler.submit(call)
+        await scheduler.aclose()
+        return scheduler.stats()
+
+    assert asyncio.run(main())["failed"] == 1
+
+def test_request_larger_than_tpm_bucket_is_rejected():
+    async def main():
+        scheduler = LLMScheduler(rpm=60, tpm=1000, burst_seconds=6)
+        with pytest.raises(ValueError):
+            await scheduler.submit(asyncio.sleep, 0, tokens=101)
+
+    asyncio.run(main())
+
+def test_rpm_bucket_smaller_than_one_request_is_rejected():
+    with pytest.raises(ValueError):
+        LLMScheduler(rpm=5, tpm=1000, burst_seconds=1)
+
+def test_aclose_fails_queued_calls_and_finishes_in_flight_ones():
+    async def main():
+        scheduler = LLMScheduler(rpm=60_000, tpm=1_000_000, max_concurrency=1)
+        in_flight = asyncio.ensure_future(scheduler.submit(asyncio.sleep, 0.05, "done"))
+        queued = [asyncio.ensure_future(scheduler.submit(asyncio.sleep, 0, i)) for i in range(3)]
+        await asyncio.sleep(0.01)
+        await asyncio.wait_for(scheduler.aclose(), timeout=1)
+        return await in_flight, await asyncio.gather(*queued, return_exceptions=True)
+
+    result, queued = asyncio.run(main())
+    assert result == "done"
+    assert all(isinstance(error, RuntimeError) for error in queued)
+
+def test_burst_through_scheduler_gets_no_429s():
+    async def main():
+        # Igual que la demo: el planificador un 10 % por debajo del límite del proveedor
+        # Same as the demo: the scheduler 10 % below the provider's limit
+        provider = SimulatedProvider(rpm=3000)
+        scheduler = LLMScheduler(rpm=2700, tpm=3_000_000, max_concurrency=10, burst_seconds=1)
+        results = await asyncio.gather(*(scheduler.submit(provider.complete, i, tokens=100)
+                                         for i in range(120)), return_exceptions=True)
+        await scheduler.aclose()
+        return provider, results
+
+    provider, results = asyncio.run(main())
+    assert provider.rate_limited == 0
+    assert not any(isinstance(result, RateLimitError) for result in results)
+    assert results[0] == "Response for 0"
+
+def test_unscheduled_burst_gets_429s():
+    async def main():
+        provider = SimulatedProvider(rpm=3000)
+        return await asyncio.gather(*(provider.complete(i) for i in range(120)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert sum(isinstance(result, RateLimitError) for result in results) > 0
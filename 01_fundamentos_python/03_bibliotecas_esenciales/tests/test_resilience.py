@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from resilience import CLOSED, HALF_OPEN, CircuitBreaker, CircuitOpenError, RetryPolicy
+
+class APIError(Exception):
+    pass
+
+async def failing_call():
+    raise APIError("503")
+
+async def ok_call():
+    return "ok"
+
+def test_breaker_opens_and_short_circuits():
+    policy = RetryPolicy(max_attempts=1, retry_on=(APIError,),
+                         breaker=CircuitBreaker(failure_threshold=2, recovery_timeout=60))
+
+    async def main():
+        for _ in range(2):
+            with pytest.raises(APIError):
+                await policy.acall(failing_call)
+        with pytest.raises(CircuitOpenError):
+            await policy.acall(ok_call)
+
+    asyncio.run(main())
+    assert policy.metrics()["short_circuited"] == 1
+
+def test_cancelled_half_open_probe_releases_its_slot():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.01)
+    policy = RetryPolicy(max_attempts=1, retry_on=(APIError,), breaker=breaker)
+
+    async def main():
+        with pytest.raises(APIError):
+            await policy.acall(failing_call)
+        await asyncio.sleep(0.02)
+        probe = asyncio.ensure_future(policy.acall(asyncio.sleep, 10))
+        await asyncio.sleep(0.01)
+        assert breaker.state == HALF_OPEN
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        return await policy.acall(ok_call)
+
+    assert asyncio.run(main()) == "ok"
+    assert breaker.state == CLOSED
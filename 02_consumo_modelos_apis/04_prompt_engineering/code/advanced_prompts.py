@@ -10,10 +10,15 @@ Requisitos: pip install openai
 import os
 from openai import OpenAI
 
+from single_flight import create_chat_completion
+
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 def get_completion(messages, model="gpt-4o"):
-    response = client.chat.completions.create(
+    # Peticiones idénticas simultáneas comparten una sola llamada a la API
+    # Identical concurrent requests share a single API call
+    response = create_chat_completion(
+        client,
         model=model,
         messages=messages,
         temperature=0.0 # Deterministic for logic
@@ -0,0 +1,201 @@
+"""
+Hedged Requests
+---------------
+La latencia de un LLM tiene una cola larga: el p99 es varias veces el p50 y
+una sola llamada lenta bloquea todo el flujo del agente. Con "hedging", si una
+petición tarda más que el percentil p (p. ej. p95) de su modelo, se envía un
+duplicado; gana la primera respuesta y la otra se cancela.
+
+LLM latency has a long tail: p99 is several times p50 and a single slow call
+stalls the whole agent flow. With hedging, if a request takes longer than
+its model's p-th percentile (e.g. p95), a duplicate is sent; the first
+response wins and the other one is cancelled.
+
+El duplicado cuesta tokens, así que la carga extra está acotada: cada petición
+con hedging aporta `max_extra_load` hedges al presupuesto (0.05 = como mucho
+un 5 % más).
+The duplicate costs tokens, so the extra load is capped: every hedged request
+adds `max_extra_load` hedges to the budget (0.05 = at most 5 % more).
+
+Con la API de OpenAI: `acreate_chat_completion(client, hedge=True, ...)` en
+single_flight.py usa el `hedger` de este módulo.
+With the OpenAI API: `acreate_chat_completion(client, hedge=True, ...)` in
+single_flight.py uses this module's `hedger`.
+"""
+
+import asyncio
+import random
+import time
+from collections import Counter, defaultdict, deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import numpy as np
+
+class LatencyTracker:
+    """
+    Ventana móvil de latencias por modelo / Rolling latency window per model.
+    """
+
+    def __init__(self, window: int = 500, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._latencies: Dict[str, deque] = defaultdict(lambda: deque(maxlen=window))
+
+    def record(self, model: str, seconds: float):
+        self._latencies[model].append(seconds)
+
+    def percentile(self, model: str, q: float) -> Optional[float]:
+        """None hasta tener `min_samples` medidas / None until `min_samples` measurements exist."""
+        latencies = self._latencies[model]
+        if len(latencies) < self.min_samples:
+            return None
+        return float(np.percentile(latencies, q))
+
+class HedgedClient:
+    """
+    Args:
+        call: Corrutina de la API; recibe `model=` entre sus kwargs (p. ej.
+            `AsyncOpenAI().chat.completions.create`).
+            API coroutine; receives `model=` among its kwargs (e.g.
+            `AsyncOpenAI().chat.completions.create`).
+        percentile: Latencia (percentil por modelo) a partir de la cual se duplica.
+            Latency (per-model percentile) after which the request is duplicated.
+        max_extra_load: Fracción máxima de peticiones extra / Maximum fraction of extra requests.
+        max_burst: Hedges acumulables en el presupuesto / Hedges the budget may accumulate.
+    """
+
+    def __init__(self, call: Callable[..., Awaitable[Any]], percentile: float = 95.0,
+                 max_extra_load: float = 0.05, max_burst: float = 10.0,
+                 window: int = 500, min_samples: int = 20):
+        self.call = call
+        self.percentile = percentile
+        self.max_extra_load = max_extra_load
+        self.max_burst = max_burst
+        self.tracker = LatencyTracker(window, min_samples)
+        self.counters: Counter = Counter()
+        self._budget = 0.0
+
+    async def _timed(self, kwargs: Dict) -> tuple:
+        start = time.monotonic()
+        result = await self.call(**kwargs)
+        return result, time.monotonic() - start
+
+    async def request(self, hedge: bool = False, **kwargs) -> Any:
+        """
+        Llama a `call(**kwargs)` con hedging (opt-in con `hedge=True`).
+        Calls `call(**kwargs)` with hedging (opt-in through `hedge=True`).
+        """
+        model = kwargs.get("model", "default")
+        self.counters["requests"] += 1
+        delay = None
+        if hedge:
+            # Solo las peticiones con hedging suman presupuesto: así la carga extra
+            # no pasa de max_extra_load de ellas
+            # Only hedged requests add budget: the extra load then stays within
+            # max_extra_load of them
+            self.counters["hedgeable"] += 1
+            self._budget = min(self.max_burst, self._budget + self.max_extra_load)
+            delay = self.tracker.percentile(model, self.percentile)
+
+        primary_start = time.monotonic()
+        tasks = [asyncio.ensure_future(self._timed(kwargs))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                if self._budget >= 1:
+                    self._budget -= 1
+                    self.counters["hedged"] += 1
+                    tasks.append(asyncio.ensure_future(self._timed(kwargs)))
+                else:
+                    self.counters["budget_exhausted"] += 1
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Si el primero en terminar falló, se espera al otro
+                # If the first one to finish failed, wait for the other one
+                winner = next((task for task in done if task.exception() is None), None)
+                if winner is not None:
+                    result, seconds = winner.result()
+                    if winner is not tasks[0]:
+                        self.counters["hedge_wins"] += 1
+                        # Se registra la petición original, no el duplicado: lo que
+                        # lleva esperando es una cota inferior de su latencia. Con la
+                        # del duplicado el percentil iría bajando solo.
+                        # The original request is recorded, not the duplicate: how
+                        # long it has waited is a lower bound of its latency. With
+                        # the duplicate's, the percentile would drift down by itself.
+                        seconds = time.monotonic() - primary_start
+                    self.tracker.record(model, seconds)
+                    return result
+            return tasks[0].result()  # Todas fallaron: se propaga el error / All failed: raise
+        finally:
+            # La petición perdedora se cancela / The losing request is cancelled
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        stats = dict(self.counters)
+        stats["extra_load"] = stats.get("hedged", 0) / max(stats.get("hedgeable", 0), 1)
+        return stats
+
+async def _chat_completion(client, **params):
+    return await client.chat.completions.create(**params)
+
+# Instancia compartida para `AsyncOpenAI` (latencias por modelo de todos los clientes)
+# Shared instance for `AsyncOpenAI` (per-model latencies across every client)
+hedger = HedgedClient(_chat_completion)
+
+if __name__ == "__main__":
+    class MockProvider:
+        """
+        Proveedor simulado como `mock_llm_call` (async_llm.py), con una
+        distribución de latencia configurable por modelo: lognormal con una
+        fracción de llamadas lentas (cola larga).
+        Simulated provider like `mock_llm_call` (async_llm.py), with a
+        configurable latency distribution per model: lognormal with a fraction
+        of slow calls (long tail).
+        """
+
+        def __init__(self, latency: Dict[str, Dict[str, float]]):
+            self.latency = latency
+            self.calls = 0
+            self.cancelled = 0
+
+        async def complete(self, model: str, prompt: str) -> str:
+            self.calls += 1
+            profile = self.latency[model]
+            delay = random.lognormvariate(np.log(profile["median"]), profile["sigma"])
+            if random.random() < profile["slow_fraction"]:
+                delay *= profile["slow_factor"]
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+            return f"Response from {model} for {prompt!r}"
+
+    latency = {"gpt-4o": {"median": 0.02, "sigma": 0.25, "slow_fraction": 0.04, "slow_factor": 10}}
+
+    async def run(hedge: bool, n: int = 600):
+        random.seed(0)
+        provider = MockProvider(latency)
+        client = HedgedClient(provider.complete, percentile=95, max_extra_load=0.1)
+        latencies = []
+        for start in range(0, n, 20):
+            # Lotes de 20 peticiones concurrentes / Batches of 20 concurrent requests
+            async def one(i):
+                t0 = time.perf_counter()
+                await client.request(hedge=hedge, model="gpt-4o", prompt=f"Question {i}")
+                latencies.append(time.perf_counter() - t0)
+            await asyncio.gather(*(one(i) for i in range(start, start + 20)))
+        p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+        label = "🪁 Hedged" if hedge else "🐢 No hedging"
+        print(f"{label:<14} p50 {p50:6.1f} ms  p99 {p99:6.1f} ms  upstream calls {provider.calls} "
+              f"(cancelled {provider.cancelled})")
+        return client
+
+    print("--- 600 requests, 4% of calls are 10x slower ---")
+    asyncio.run(run(hedge=False))
+    client = asyncio.run(run(hedge=True))
+    print(f"📊 {client.stats()}")
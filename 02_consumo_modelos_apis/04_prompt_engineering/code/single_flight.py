@@ -0,0 +1,158 @@
+"""
+Single-Flight Request Coalescing
+--------------------------------
+Cuando la misma pregunta llega muchas veces en el mismo segundo, cada copia
+se convierte en una llamada a la API. Con "single flight", las peticiones
+idénticas que coinciden en el tiempo comparten una única llamada upstream y
+su resultado (o su excepción).
+
+When the same question arrives many times within a second, each copy
+becomes an API call. With "single flight", identical requests that overlap
+in time share one upstream call and its result (or its exception).
+
+La clave es un hash canónico de (modelo, mensajes, parámetros). No es una
+caché: en cuanto la llamada termina, la siguiente petición vuelve a la API.
+The key is a canonical hash of (model, messages, params). It is not a
+cache: as soon as the call finishes, the next request goes to the API again.
+
+Nota: con temperature > 0 las peticiones coalescidas reciben la misma muestra.
+Note: with temperature > 0 coalesced requests get the same sample.
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict
+
+from hedged_requests import hedger
+
+def request_key(**request) -> str:
+    """
+    Hash canónico de la petición: el orden de las claves no cambia la clave.
+    Canonical request hash: key order does not change the key.
+    """
+    payload = json.dumps(request, sort_keys=True, separators=(",", ":"),
+                         ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes con la misma clave, desde hilos (`do`) o
+    desde asyncio (`ado`).
+    Groups concurrent calls with the same key, from threads (`do`) or from
+    asyncio (`ado`).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self._tasks: Dict[tuple, asyncio.Task] = {}
+        self.upstream_calls = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.upstream_calls += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            # Espera el resultado (o la excepción) de la llamada en curso
+            # Wait for the in-flight call's result (or exception)
+            return future.result()
+
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result()
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        # Las tareas pertenecen a un event loop: la clave incluye el loop
+        # Tasks belong to one event loop: the key includes the loop
+        task_key = (id(asyncio.get_running_loop()), key)
+        task = self._tasks.get(task_key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self._tasks[task_key] = task
+            self.upstream_calls += 1
+            task.add_done_callback(lambda _: self._tasks.pop(task_key, None))
+        # shield: si un solicitante se cancela, la llamada compartida sigue
+        # shield: if one caller is cancelled, the shared call keeps going
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        return {"upstream_calls": self.upstream_calls, "coalesced": self.coalesced,
+                "in_flight": len(self._calls) + len(self._tasks)}
+
+# Instancia compartida por el módulo / Module-wide shared instance
+flight = SingleFlight()
+
+def create_chat_completion(client, **params):
+    """
+    `client.chat.completions.create(**params)` con coalescing.
+    `client.chat.completions.create(**params)` with coalescing.
+    """
+    return flight.do(request_key(**params), lambda: client.chat.completions.create(**params))
+
+async def acreate_chat_completion(client, hedge: bool = False, **params):
+    """
+    Versión para `AsyncOpenAI`. Con `hedge=True` (opt-in) la llamada upstream
+    pasa por `hedged_requests.hedger`: si supera el p95 de su modelo se duplica.
+    Version for `AsyncOpenAI`. With `hedge=True` (opt-in) the upstream call
+    goes through `hedged_requests.hedger`: past its model's p95 it is duplicated.
+    """
+    if hedge:
+        return await flight.ado(request_key(**params),
+                                lambda: hedger.request(hedge=True, client=client, **params))
+    return await flight.ado(request_key(**params), lambda: client.chat.completions.create(**params))
+
+if __name__ == "__main__":
+    from types import SimpleNamespace
+
+    class MockCompletions:
+        # API simulada: 0.2 s por llamada / Simulated API: 0.2 s per call
+        def create(self, **params):
+            time.sleep(0.2)
+            return SimpleNamespace(choices=[SimpleNamespace(
+                message=SimpleNamespace(content=f"Answer to: {params['messages'][-1]['content']}"))])
+
+    class AsyncMockCompletions:
+        async def create(self, **params):
+            await asyncio.sleep(0.2)
+            return f"Answer to: {params['messages'][-1]['content']}"
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=MockCompletions()))
+    async_client = SimpleNamespace(chat=SimpleNamespace(completions=AsyncMockCompletions()))
+    questions = ["What are your opening hours?"] * 40 + [f"Question {i}" for i in range(5)]
+
+    print("--- Threads ---")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=50) as pool:
+        answers = list(pool.map(lambda q: create_chat_completion(
+            client, model="gpt-4o", messages=[{"role": "user", "content": q}], temperature=0.0),
+            questions))
+    print(f"✅ {len(answers)} answers in {time.perf_counter() - start:.2f}s | {flight.stats()}")
+
+    print("\n--- Asyncio ---")
+    flight = SingleFlight()  # Contadores desde cero / Counters from zero
+
+    async def main():
+        return await asyncio.gather(*(acreate_chat_completion(
+            async_client, temperature=0.0, messages=[{"role": "user", "content": q}], model="gpt-4o")
+            for q in questions))
+
+    start = time.perf_counter()
+    answers = asyncio.run(main())
+    print(f"✅ {len(answers)} answers in {time.perf_counter() - start:.2f}s | {flight.stats()}")
@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+from hedged_requests import HedgedClient
+
+class ScriptedProvider:
+    """
+    Cada llamada duerme el siguiente retardo de la lista / Every call sleeps the next delay in the list.
+    """
+
+    def __init__(self, delays, fail=False):
+        self.delays = list(delays)
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = 0
+
+    async def complete(self, model: str, prompt: str) -> str:
+        delay = self.delays[min(self.calls, len(self.delays) - 1)]
+        self.calls += 1
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise RuntimeError("500")
+        return f"answer {self.calls}"
+
+def warmed_client(provider, **kwargs) -> HedgedClient:
+    # p95 de 10 ms sin pasar por el proveedor / p95 of 10 ms without calling the provider
+    client = HedgedClient(provider.complete, min_samples=5, **kwargs)
+    for _ in range(5):
+        client.tracker.record("gpt-4o", 0.01)
+    return client
+
+def test_hedging_is_opt_in():
+    provider = ScriptedProvider([0.05])
+    client = warmed_client(provider, max_extra_load=1.0)
+    asyncio.run(client.request(model="gpt-4o", prompt="hi"))
+    assert provider.calls == 1
+    assert client.stats().get("hedged", 0) == 0
+
+def test_slow_primary_is_hedged_and_cancelled():
+    provider = ScriptedProvider([1.0, 0.01])
+    client = warmed_client(provider, max_extra_load=1.0)
+
+    async def main():
+        return await asyncio.wait_for(client.request(hedge=True, model="gpt-4o", prompt="hi"), 0.5)
+
+    assert asyncio.run(main()) == "answer 2"
+    assert provider.calls == 2
+    assert provider.cancelled == 1
+    assert client.stats()["hedge_wins"] == 1
+
+def test_lost_primary_records_its_elapsed_time():
+    provider = ScriptedProvider([1.0, 0.05])
+    client = warmed_client(provider, max_extra_load=1.0)
+    asyncio.run(client.request(hedge=True, model="gpt-4o", prompt="hi"))
+    # El primario llevaba ~60 ms (10 ms de espera + 50 ms del duplicado), no los 50 ms del duplicado
+    # The primary had waited ~60 ms (10 ms delay + the duplicate's 50 ms), not the duplicate's 50 ms
+    assert client.tracker._latencies["gpt-4o"][-1] >= 0.055
+
+def test_budget_caps_extra_load():
+    provider = ScriptedProvider([0.03])
+    client = warmed_client(provider, max_extra_load=0.25)
+
+    async def main():
+        # 8 peticiones a la vez: 8 * 0.25 = 2 hedges de presupuesto
+        # 8 requests at once: 8 * 0.25 = 2 hedges of budget
+        await asyncio.gather(*(client.request(hedge=True, model="gpt-4o", prompt="hi")
+                               for _ in range(8)))
+
+    asyncio.run(main())
+    stats = client.stats()
+    assert stats["hedged"] == 2
+    assert stats["budget_exhausted"] == 6
+    assert stats["extra_load"] == pytest.approx(0.25)
+
+def test_error_is_raised_when_every_attempt_fails():
+    provider = ScriptedProvider([0.03], fail=True)
+    client = warmed_client(provider, max_extra_load=1.0)
+    with pytest.raises(RuntimeError):
+        asyncio.run(client.request(hedge=True, model="gpt-4o", prompt="hi"))
+    assert provider.calls == 2
+
+def test_unhedged_requests_do_not_add_budget():
+    provider = ScriptedProvider([0.03] * 4 + [0.2])
+    client = warmed_client(provider, max_extra_load=0.5)
+
+    async def main():
+        for _ in range(4):
+            await client.request(model="gpt-4o", prompt="hi")
+        await client.request(hedge=True, model="gpt-4o", prompt="hi")
+
+    asyncio.run(main())
+    # Solo la petición con hedge suma 0.5: no llega a un hedge entero
+    # Only the hedged request adds 0.5: not enough for a whole hedge
+    assert client.stats().get("hedged", 0) == 0
+    assert client.stats()["budget_exhausted"] == 1
+
+def test_chat_completion_hedging_is_opt_in():
+    from types import SimpleNamespace
+
+    import single_flight
+    from hedged_requests import hedger
+
+    provider = ScriptedProvider([1.0, 0.01])
+
+    async def create(model, messages):
+        return await provider.complete(model, messages[-1]["content"])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    for _ in range(hedger.tracker.min_samples):
+        hedger.tracker.record("test-model", 0.01)
+    hedger._budget = 1.0
+
+    async def main():
+        return await asyncio.wait_for(single_flight.acreate_chat_completion(
+            client, hedge=True, model="test-model", messages=[{"role": "user", "content": "hi"}]), 0.5)
+
+    assert asyncio.run(main()) == "answer 2"
+    assert provider.cancelled == 1
+
+    provider = ScriptedProvider([0.05])
+    asyncio.run(single_flight.acreate_chat_completion(
+        client, model="test-model", messages=[{"role": "user", "content": "hi"}]))
+    assert provider.calls == 1
@@ -0,0 +1,222 @@
+"""
+Retrieval Benchmark
+-------------------
+Mide el camino de búsqueda de `SimpleVectorStore` sobre corpus sintéticos:
+QPS, latencia p50/p95/p99, memoria y recall@k frente a fuerza bruta, para la
+búsqueda exacta y los modos aproximados (IVF, SQ8, PQ). Los resultados se
+guardan en JSON para comparar ejecuciones entre commits.
+
+Measures the `SimpleVectorStore` search path on synthetic corpora: QPS,
+p50/p95/p99 latency, memory and recall@k against brute force, for exact
+search and the approximate modes (IVF, SQ8, PQ). Results are saved as JSON
+to compare runs across commits.
+
+Uso / Usage:
+    python benchmark_retrieval.py --n-docs 100000 --dim 128 --output after.json
+    python benchmark_retrieval.py --compare before.json after.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from simple_rag_pipeline import SimpleVectorStore, _normalize, _top_k
+
+def make_corpus(n_docs: int, dim: int, n_queries: int = 200, n_clusters: int = 100,
+                seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Corpus sintético con clusters (mezcla de gaussianas), más parecido a
+    embeddings reales que un ruido uniforme. Las queries son documentos con ruido.
+    Synthetic clustered corpus (Gaussian mixture), closer to real embeddings
+    than uniform noise. Queries are noisy documents.
+
+    Returns:
+        (documentos, queries) normalizados / normalized (documents, queries).
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, n_docs)
+    docs = centers[labels] + 0.5 * rng.standard_normal((n_docs, dim)).astype(np.float32)
+    picks = rng.choice(n_docs, n_queries, replace=n_queries > n_docs)
+    queries = docs[picks] + 0.3 * rng.standard_normal((n_queries, dim)).astype(np.float32)
+    return _normalize(docs), _normalize(queries)
+
+def ground_truth(docs: np.ndarray, queries: np.ndarray, k: int) -> List[np.ndarray]:
+    # Top-k exacto por fuerza bruta / Exact top-k by brute force
+    return [_top_k(docs @ query, k) for query in queries]
+
+def _lookup_embedder(docs: np.ndarray, queries: np.ndarray) -> Callable[[List[str]], np.ndarray]:
+    # Textos "d<i>" / "q<i>" -> vector precalculado, para no medir el modelo de embeddings
+    # Texts "d<i>" / "q<i>" -> precomputed vector, so the embedding model is not measured
+    def embed(texts: List[str]) -> np.ndarray:
+        return np.stack([(docs if text[0] == "d" else queries)[int(text[1:])] for text in texts])
+    return embed
+
+def _index_bytes(store: SimpleVectorStore) -> int:
+    index = store._index
+    if index is None:
+        return 0
+    return index.centroids.nbytes + index.ids.nbytes + index.offsets.nbytes
+
+def _peak_rss_bytes() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    # ru_maxrss está en KB en Linux y en bytes en macOS / ru_maxrss is KB on Linux, bytes on macOS
+    scale = 1 if platform.system() == "Darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_config(name: str, store: SimpleVectorStore, n_queries: int, truth: List[np.ndarray],
+               k: int, build_seconds: float, warmup: int = 5, **search_kwargs) -> Dict:
+    """Latencia, QPS y recall@k de una configuración / Latency, QPS and recall@k of one setup."""
+    row_of = {f"d{i}": i for i in range(store._size)}
+    for i in range(min(warmup, n_queries)):
+        store.search(f"q{i}", k=k, **search_kwargs)
+
+    latencies, found = np.empty(n_queries), 0
+    start = time.perf_counter()
+    for i in range(n_queries):
+        t0 = time.perf_counter()
+        results = store.search(f"q{i}", k=k, **search_kwargs)
+        latencies[i] = time.perf_counter() - t0
+        found += len(np.intersect1d([row_of[text] for text in results], truth[i]))
+    elapsed = time.perf_counter() - start
+
+    memory = store.memory_usage()
+    p50, p95, p99 = np.percentile(latencies * 1000, [50, 95, 99])
+    return {
+        "name": name,
+        "params": {key: value for key, value in search_kwargs.items() if value is not None},
+        "qps": n_queries / elapsed,
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "p99_ms": p99,
+        f"recall@{k}": found / sum(len(t) for t in truth[:n_queries]),
+        "memory_bytes": memory["vectors"] + memory["codes"] + _index_bytes(store),
+        "build_seconds": build_seconds,
+    }
+
+def run_benchmark(n_docs: int = 100_000, dim: int = 128, n_queries: int = 200, k: int = 10,
+                  nprobes: Tuple[int, ...] = (1, 4, 16), shards: int = 0,
+                  seed: int = 0) -> Dict:
+    """
+    Ejecuta todas las configuraciones sobre el mismo corpus.
+    Runs every configuration on the same corpus.
+
+    Args:
+        shards: Shards del escaneo exacto (0 = uno por núcleo).
+            Shards for the exact scan (0 = one per core).
+    """
+    docs, queries = make_corpus(n_docs, dim, n_queries, seed=seed)
+    truth = ground_truth(docs, queries, k)
+    embed_fn = _lookup_embedder(docs, queries)
+    texts = [f"d{i}" for i in range(n_docs)]
+
+    def build(setup: Optional[Callable[[SimpleVectorStore], None]] = None,
+              n_shards: int = 1) -> Tuple[SimpleVectorStore, float]:
+        store = SimpleVectorStore(embed_fn=embed_fn, shards=n_shards)
+        start = time.perf_counter()
+        store.add_documents(texts)
+        if setup is not None:
+            setup(store)
+        return store, time.perf_counter() - start
+
+    results = []
+    store, seconds = build()
+    results.append(run_config("exact", store, n_queries, truth, k, seconds))
+    shards = shards or os.cpu_count() or 1
+    if shards > 1:
+        store, seconds = build(n_shards=shards)
+        results.append(run_config(f"exact-sharded-{shards}", store, n_queries, truth, k, seconds))
+    del store
+
+    ivf, seconds = build(lambda s: s.build_index(seed=seed))
+    for nprobe in nprobes:
+        results.append(run_config(f"ivf-nprobe-{nprobe}", ivf, n_queries, truth, k, seconds,
+                                  nprobe=nprobe))
+    del ivf
+
+    for method in ("sq8", "pq"):
+        quantized, seconds = build(lambda s: s.quantize(method, keep_vectors=False, seed=seed))
+        results.append(run_config(method, quantized, n_queries, truth, k, seconds))
+        # El re-score exacto necesita los vectores: se mantienen en otra instancia
+        # Exact re-score needs the vectors: they are kept in another instance
+        quantized, seconds = build(lambda s: s.quantize(method, seed=seed))
+        results.append(run_config(f"{method}-rescore", quantized, n_queries, truth, k, seconds,
+                                  rescore=4 * k))
+        del quantized
+
+    return {
+        "config": {"n_docs": n_docs, "dim": dim, "n_queries": n_queries, "k": k, "seed": seed},
+        "environment": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "peak_rss_bytes": _peak_rss_bytes(),
+        },
+        "results": results,
+    }
+
+def print_report(report: Dict):
+    k = report["config"]["k"]
+    print(f"{'config':<22}{'QPS':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{f'recall@{k}':>11}{'MB':>9}")
+    for r in report["results"]:
+        print(f"{r['name']:<22}{r['qps']:>10.1f}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}"
+              f"{r['p99_ms']:>9.2f}{r[f'recall@{k}']:>11.3f}{r['memory_bytes'] / 2**20:>9.1f}")
+
+def compare(before: Dict, after: Dict):
+    """Cambios de QPS, p99 y recall por configuración / QPS, p99 and recall changes per setup."""
+    k = after["config"]["k"]
+    previous = {r["name"]: r for r in before["results"]}
+    print(f"{before['environment']['commit']} -> {after['environment']['commit']}")
+    for r in after["results"]:
+        old = previous.get(r["name"])
+        if old is None:
+            print(f"  {r['name']:<22} (new)")
+            continue
+        print(f"  {r['name']:<22} QPS {r['qps'] / old['qps'] - 1:+7.1%}  "
+              f"p99 {r['p99_ms'] / old['p99_ms'] - 1:+7.1%}  "
+              f"recall {r[f'recall@{k}'] - old.get(f'recall@{k}', 0):+.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SimpleVectorStore retrieval benchmark")
+    parser.add_argument("--n-docs", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--n-queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--shards", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="retrieval_benchmark.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="compara dos JSON guardados / compare two saved JSON files")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f_before, open(args.compare[1]) as f_after:
+            compare(json.load(f_before), json.load(f_after))
+    else:
+        print(f"⏱️  Benchmark: {args.n_docs} docs x {args.dim} dims, {args.n_queries} queries")
+        report = run_benchmark(args.n_docs, args.dim, args.n_queries, args.k,
+                               tuple(args.nprobe), args.shards, args.seed)
+        print_report(report)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Saved to {args.output}")
@@ -0,0 +1,146 @@
+"""
+BM25 Inverted Index
+-------------------
+Índice invertido para búsqueda por palabras clave (BM25). Cada término guarda
+su posting list (filas donde aparece + frecuencia) en arrays compactos de
+enteros de 4 bytes; una query solo recorre las posting lists de sus términos,
+así que el coste no crece con el tamaño del corpus sino con la frecuencia de
+esos términos.
+
+Inverted index for keyword search (BM25). Each term keeps its posting list
+(rows where it appears + frequency) in compact 4-byte integer arrays; a query
+only walks the posting lists of its own terms, so the cost grows with the
+frequency of those terms rather than with the corpus size.
+"""
+
+import re
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"\w+")
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+class BM25Index:
+    """
+    Args:
+        k1: Saturación de la frecuencia del término / Term frequency saturation.
+        b: Peso de la normalización por longitud / Length normalization weight.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # término -> (filas, frecuencias) / term -> (rows, frequencies)
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._lengths = array("i")
+        self._total_length = 0
+        # Filas retiradas (tombstones) que aún siguen en las posting lists:
+        # se descuentan de las estadísticas hasta el próximo compact()
+        # Removed rows (tombstones) still present in the posting lists:
+        # subtracted from the statistics until the next compact()
+        self._n_removed = 0
+        self._removed_df: Counter = Counter()
+
+    @property
+    def n_docs(self) -> int:
+        """Documentos vivos / Alive documents."""
+        return len(self._lengths) - self._n_removed
+
+    def add(self, texts: List[str]):
+        """Indexa `texts` como las filas siguientes / Indexes `texts` as the next rows."""
+        for text in texts:
+            row = len(self._lengths)
+            tokens = tokenize(text)
+            self._lengths.append(len(tokens))
+            self._total_length += len(tokens)
+            for term, tf in Counter(tokens).items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = (array("i"), array("i"))
+                postings[0].append(row)
+                postings[1].append(tf)
+
+    def remove(self, texts: List[str]):
+        """
+        Descuenta de N, df y la longitud media las filas retiradas con estos
+        textos, para que el ranking no cambie tras un upsert o delete. Las
+        filas siguen en las posting lists (el llamador las filtra) hasta compact().
+        Subtracts the removed rows with these texts from N, df and the average
+        length, so rankings do not drift after an upsert or delete. The rows
+        stay in the posting lists (the caller filters them) until compact().
+        """
+        for text in texts:
+            tokens = tokenize(text)
+            self._n_removed += 1
+            self._total_length -= len(tokens)
+            self._removed_df.update(set(tokens))
+
+    def score(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Filas que contienen algún término de la query y su score BM25.
+        Rows containing any query term and their BM25 score.
+        """
+        n_docs = self.n_docs
+        if n_docs == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        lengths = np.frombuffer(self._lengths, dtype=np.int32)
+        avg_length = max(self._total_length / n_docs, 1e-9)
+
+        all_rows, all_scores = [], []
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            # Vistas sin copia sobre los arrays compactos / Zero-copy views over the compact arrays
+            rows = np.frombuffer(postings[0], dtype=np.int32)
+            tf = np.frombuffer(postings[1], dtype=np.int32).astype(np.float32)
+            df = len(rows) - self._removed_df[term]
+            idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * lengths[rows] / avg_length)
+            all_rows.append(rows)
+            all_scores.append(idf * tf * (self.k1 + 1) / (tf + norm))
+
+        if not all_rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        # Suma por fila de las contribuciones de cada término
+        # Per-row sum of every term's contribution
+        rows, inverse = np.unique(np.concatenate(all_rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores)).astype(np.float32)
+        return rows.astype(np.int64), scores
+
+    def compact(self, old_to_new: np.ndarray):
+        """Renumera filas tras una compactación (-1 = eliminada) / Renumbers rows after a compaction (-1 = removed)."""
+        lengths = np.frombuffer(self._lengths, dtype=np.int32)
+        alive = old_to_new[:len(lengths)] >= 0
+        self._lengths = array("i", lengths[alive].tobytes())
+        self._total_length = int(lengths[alive].sum())
+        self._n_removed = 0
+        self._removed_df = Counter()
+        for term in list(self._postings):
+            rows, tf = (np.frombuffer(a, dtype=np.int32) for a in self._postings[term])
+            new_rows = old_to_new[rows]
+            keep = new_rows >= 0
+            if not keep.any():
+                del self._postings[term]
+                continue
+            self._postings[term] = (array("i", new_rows[keep].astype(np.int32).tobytes()),
+                                    array("i", tf[keep].tobytes()))
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], k: int, rrf_k: int = 60,
+                           weights: Optional[List[float]] = None) -> np.ndarray:
+    """
+    Fusiona varias listas ordenadas de filas: score = Σ 1 / (rrf_k + rank).
+    Fuses several ranked lists of rows: score = Σ 1 / (rrf_k + rank).
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused: Dict[int, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, row in enumerate(ranking.tolist(), start=1):
+            fused[row] = fused.get(row, 0.0) + weight / (rrf_k + rank)
+    # Empates: gana la fila más antigua / Ties: the oldest row wins
+    return np.array(sorted(fused, key=lambda row: (-fused[row], row))[:k], dtype=np.int64)
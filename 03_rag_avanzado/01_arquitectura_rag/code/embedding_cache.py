@@ -0,0 +1,155 @@
+"""
+Embedding Cache (Content-Addressed)
+-----------------------------------
+Capa de embeddings que envuelve cualquier función de embedding con una caché
+indexada por el hash del contenido: una LRU en memoria con tamaño máximo y,
+opcionalmente, un almacén en disco (SQLite) que sobrevive a reinicios.
+
+Embedding layer that wraps any embedding function with a cache keyed by the
+content hash: a size-capped in-memory LRU and, optionally, an on-disk store
+(SQLite) that survives restarts.
+
+Re-indexar un corpus casi sin cambios solo paga por los textos nuevos.
+Re-indexing a mostly unchanged corpus only pays for the new texts.
+"""
+
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+class CachedEmbedder:
+    """
+    Args:
+        embed_fn: Función texto -> vector / Text -> vector function.
+        batch_fn: Opcional, lista de textos -> matriz; si existe, los fallos de
+            caché se calculan en una sola llamada.
+            Optional, list of texts -> matrix; if given, cache misses are
+            computed in a single call.
+        max_entries: Tamaño máximo de la LRU en memoria / Max in-memory LRU size.
+        cache_path: Fichero SQLite para la caché en disco / SQLite file for the disk cache.
+        namespace: Nombre del modelo; evita mezclar vectores de modelos distintos.
+            Model name; keeps vectors from different models apart.
+    """
+
+    def __init__(self, embed_fn: Callable[[str], np.ndarray],
+                 batch_fn: Optional[Callable[[List[str]], np.ndarray]] = None,
+                 max_entries: int = 10_000, cache_path: Optional[str] = None,
+                 namespace: str = "default"):
+        self.embed_fn = embed_fn
+        self.batch_fn = batch_fn
+        self.max_entries = max_entries
+        self.namespace = namespace
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        if cache_path is not None:
+            self._db = sqlite3.connect(cache_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings "
+                             "(key TEXT PRIMARY KEY, dtype TEXT, vector BLOB)")
+            self._db.commit()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.namespace}\0{text}".encode("utf-8")).hexdigest()
+
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        return self.embed_many(texts)
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: List[str]) -> np.ndarray:
+        """
+        Vectores de `texts` como matriz; solo se calculan los que no están en caché.
+        Vectors for `texts` as a matrix; only texts missing from the cache are computed.
+        """
+        keys = [self.key(text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                    self.hits += 1
+
+        # Textos repetidos dentro del lote se calculan una sola vez
+        # Texts repeated within the batch are computed only once
+        pending = {key: text for key, text in zip(keys, texts) if key not in found}
+        if pending:
+            from_disk = self._load(list(pending))
+            found.update(from_disk)
+            missing = {key: text for key, text in pending.items() if key not in from_disk}
+            if missing:
+                computed = dict(zip(missing, self._compute(list(missing.values()))))
+                self._store(computed)
+                found.update(computed)
+            with self._lock:
+                self.disk_hits += len(from_disk)
+                self.misses += len(missing)
+                # Las repeticiones dentro del lote cuentan como aciertos
+                # Repeats within the batch count as hits
+                self.hits += sum(1 for key in keys if key in pending) - len(pending)
+                for key in pending:
+                    self._remember(key, found[key])
+
+        if not texts:
+            return np.empty((0, 0))
+        return np.stack([found[key] for key in keys])
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+    def _compute(self, texts: List[str]) -> List[np.ndarray]:
+        if self.batch_fn is not None:
+            return list(np.asarray(self.batch_fn(texts)))
+        return [np.asarray(self.embed_fn(text)) for text in texts]
+
+    def _remember(self, key: str, vector: np.ndarray):
+        # Los vectores cacheados son de solo lectura para que nadie los altere
+        # Cached vectors are read-only so nobody can alter them
+        vector.flags.writeable = False
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _load(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        if self._db is None:
+            return {}
+        found = {}
+        with self._lock:
+            # SQLite limita el número de parámetros por consulta
+            # SQLite limits the number of parameters per query
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT key, dtype, vector FROM embeddings WHERE key IN "
+                    f"({','.join('?' * len(chunk))})", chunk)
+                for key, dtype, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=dtype)
+        return found
+
+    def _store(self, vectors: Dict[str, np.ndarray]):
+        if self._db is None:
+            return
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                [(key, vector.dtype.str, vector.tobytes()) for key, vector in vectors.items()])
+            self._db.commit()
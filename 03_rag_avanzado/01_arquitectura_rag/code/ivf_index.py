@@ -0,0 +1,137 @@
+"""
+IVF Index (Inverted File) con NumPy
+-----------------------------------
+Índice aproximado de vecinos más cercanos: un cuantizador grueso (k-means)
+reparte los vectores en "listas" y la búsqueda solo visita las `nprobe`
+listas más cercanas a la query.
+
+Approximate nearest-neighbour index: a coarse quantizer (k-means) splits the
+vectors into "lists" and search only visits the `nprobe` lists closest to the
+query.
+
+    nprobe pequeño -> más rápido, menos recall / smaller nprobe -> faster, less recall
+    nprobe = n_lists -> equivalente a fuerza bruta / equivalent to brute force
+"""
+
+import numpy as np
+from typing import Optional
+
+def _assign(data: np.ndarray, centroids: np.ndarray, spherical: bool,
+            chunk_size: int = 65536) -> np.ndarray:
+    # Asigna cada fila a su centroide más cercano, por bloques para acotar RAM
+    # Assigns each row to its closest centroid, in blocks to bound RAM
+    bias = 0.0 if spherical else -0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    labels = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), chunk_size):
+        block = np.asarray(data[start:start + chunk_size], dtype=np.float32)
+        # Euclídea: argmin ||x-c||² == argmax (x·c - ||c||²/2)
+        labels[start:start + len(block)] = np.argmax(block @ centroids.T + bias, axis=1)
+    return labels
+
+def kmeans(data: np.ndarray, n_clusters: int, n_iter: int = 20, seed: int = 0,
+           spherical: bool = False) -> np.ndarray:
+    """
+    K-means de Lloyd, solo NumPy. Con `spherical=True` los centroides se
+    normalizan y la asignación usa similitud coseno.
+    Lloyd's k-means, NumPy only. With `spherical=True` centroids are normalized
+    and assignment uses cosine similarity.
+
+    Returns:
+        Centroides (n_clusters, dim) en float32 / Centroids (n_clusters, dim) as float32.
+    """
+    rng = np.random.default_rng(seed)
+    n, dim = data.shape
+    if n_clusters > n:
+        raise ValueError(f"n_clusters ({n_clusters}) > number of vectors ({n})")
+
+    centroids = np.array(data[np.sort(rng.choice(n, n_clusters, replace=False))],
+                         dtype=np.float32)
+    for _ in range(n_iter):
+        labels = _assign(data, centroids, spherical)
+        counts = np.bincount(labels, minlength=n_clusters)
+
+        # Suma por cluster: ordenar por etiqueta + reduceat (mucho más rápido que np.add.at)
+        # Per-cluster sums: sort by label + reduceat (much faster than np.add.at)
+        order = np.argsort(labels, kind="stable")
+        present = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[present]
+        sums = np.zeros((n_clusters, dim), dtype=np.float64)
+        sums[present] = np.add.reduceat(np.asarray(data[order], dtype=np.float64), starts)
+
+        # Clusters vacíos: se re-siembran con un punto aleatorio
+        # Empty clusters: re-seed them with a random point
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = data[rng.choice(n, int(empty.sum()), replace=False)]
+            counts[empty] = 1
+
+        centroids = (sums / counts[:, None]).astype(np.float32)
+        if spherical:
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            centroids /= np.where(norms == 0, 1, norms)
+    return centroids
+
+class IVFIndex:
+    """
+    Cuantizador grueso + listas invertidas (posting lists) en formato CSR:
+    los ids de la lista `c` son `ids[offsets[c]:offsets[c + 1]]`.
+    Coarse quantizer + inverted lists (posting lists) in CSR layout:
+    the ids of list `c` are `ids[offsets[c]:offsets[c + 1]]`.
+    """
+
+    def __init__(self, n_lists: int, nprobe: int = 1):
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.centroids: Optional[np.ndarray] = None
+        self.offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        self.ids = np.empty(0, dtype=np.int64)
+
+    @property
+    def n_indexed(self) -> int:
+        return len(self.ids)
+
+    def train(self, vectors: np.ndarray, n_iter: int = 20, seed: int = 0,
+              max_train_points: Optional[int] = None):
+        # Entrenar sobre una muestra basta para el cuantizador grueso (~64 puntos por lista)
+        # Training on a sample is enough for the coarse quantizer (~64 points per list)
+        max_train_points = max_train_points or 64 * self.n_lists
+        sample = vectors
+        if len(vectors) > max_train_points:
+            rng = np.random.default_rng(seed)
+            sample = vectors[np.sort(rng.choice(len(vectors), max_train_points, replace=False))]
+        self.centroids = kmeans(sample, self.n_lists, n_iter=n_iter, seed=seed, spherical=True)
+
+    def add(self, vectors: np.ndarray):
+        """
+        Asigna todas las filas a su lista y construye las posting lists.
+        Assigns every row to its list and builds the posting lists.
+        """
+        labels = _assign(vectors, self.centroids, spherical=True)
+        # Orden estable: dentro de cada lista los ids quedan ascendentes
+        # Stable sort: ids stay ascending within each list
+        self.ids = np.argsort(labels, kind="stable")
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(labels, minlength=self.n_lists))))
+
+    def candidates(self, query_vector: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        """
+        Ids (ascendentes) de las `nprobe` listas más cercanas a la query.
+        Ids (ascending) of the `nprobe` lists closest to the query.
+        """
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        centroid_scores = self.centroids @ query_vector
+        probed = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        ids = np.concatenate([self.ids[self.offsets[c]:self.offsets[c + 1]] for c in probed])
+        return np.sort(ids)
+
+    def remap(self, old_to_new: np.ndarray):
+        """
+        Renumera las filas tras una compactación (-1 = fila eliminada) sin
+        re-asignar vectores: las posting lists conservan su orden.
+        Renumbers rows after a compaction (-1 = removed row) without
+        re-assigning vectors: posting lists keep their order.
+        """
+        new_ids = old_to_new[self.ids]
+        keep = new_ids >= 0
+        labels = np.repeat(np.arange(self.n_lists), np.diff(self.offsets))[keep]
+        self.ids = new_ids[keep]
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(labels, minlength=self.n_lists))))
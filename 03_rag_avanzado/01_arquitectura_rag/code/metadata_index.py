@@ -0,0 +1,112 @@
+"""
+Metadata Bitmap Index
+---------------------
+Índice de metadatos con un bitmap (máscara booleana) precalculado por cada par
+(columna, valor). Un filtro como `where={"source": "doc1"}` se resuelve con
+operaciones AND/OR/NOT sobre máscaras, antes de puntuar ningún vector.
+
+Metadata index with a precomputed bitmap (boolean mask) per (column, value)
+pair. A filter such as `where={"source": "doc1"}` is resolved with AND/OR/NOT
+operations on masks, before any vector is scored.
+
+Sintaxis de `where` (subconjunto de la de ChromaDB) / `where` syntax (ChromaDB subset):
+    {"source": "doc1"}                      igualdad / equality
+    {"source": {"$in": ["doc1", "doc2"]}}   pertenencia / membership
+    {"source": {"$ne": "doc1"}}             distinto / not equal
+    {"source": {"$nin": ["doc1"]}}          no pertenece / not in
+    Varias claves se combinan con AND / Several keys are combined with AND.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+_ALLOWED_TYPES = (str, int, float, bool)
+
+def _condition(condition: Any) -> Tuple[str, List[Any]]:
+    # Normaliza una condición a (operador, valores) / Normalizes a condition to (operator, values)
+    if not isinstance(condition, dict):
+        return "$in", [condition]
+    if len(condition) != 1:
+        raise ValueError(f"Expected a single operator, got {condition!r}")
+    op, value = next(iter(condition.items()))
+    if op in ("$eq", "$ne"):
+        return ("$in" if op == "$eq" else "$nin"), [value]
+    if op in ("$in", "$nin"):
+        return op, list(value)
+    raise ValueError(f"Unsupported operator: {op!r}")
+
+def matches(metadata: Optional[Dict], where: Dict) -> bool:
+    """
+    Evalúa `where` sobre un único dict de metadatos (versión sin índice).
+    Evaluates `where` on a single metadata dict (index-free version).
+    """
+    metadata = metadata or {}
+    for column, condition in where.items():
+        op, values = _condition(condition)
+        present = column in metadata and metadata[column] in values
+        if present != (op == "$in"):
+            return False
+    return True
+
+class BitmapIndex:
+    """
+    Un array booleano por (columna, valor): bitmap[fila] es True si la fila
+    tiene ese valor. Los bitmaps crecen x2 igual que la matriz de vectores.
+    One boolean array per (column, value): bitmap[row] is True if the row has
+    that value. Bitmaps grow x2 just like the vector matrix.
+    """
+
+    def __init__(self):
+        self._bitmaps: Dict[Tuple[str, Any], np.ndarray] = {}
+
+    def add(self, first_row: int, metadatas: List[Optional[Dict]]):
+        # Agrupamos filas por (columna, valor) para una sola asignación NumPy por bitmap
+        # Group rows by (column, value) so each bitmap gets a single NumPy assignment
+        groups: Dict[Tuple[str, Any], List[int]] = {}
+        for offset, metadata in enumerate(metadatas):
+            for column, value in (metadata or {}).items():
+                if not isinstance(value, _ALLOWED_TYPES):
+                    raise ValueError(f"Metadata value for {column!r} must be str, int, float "
+                                     f"or bool, got {type(value).__name__}")
+                groups.setdefault((column, value), []).append(first_row + offset)
+
+        end = first_row + len(metadatas)
+        for key, rows in groups.items():
+            bitmap = self._bitmaps.get(key)
+            if bitmap is None or len(bitmap) < end:
+                grown = np.zeros(max(end, 16, 2 * len(bitmap) if bitmap is not None else 0),
+                                 dtype=bool)
+                if bitmap is not None:
+                    grown[:len(bitmap)] = bitmap
+                bitmap = self._bitmaps[key] = grown
+            bitmap[rows] = True
+
+    def bitmap(self, column: str, value: Any, size: int) -> np.ndarray:
+        mask = np.zeros(size, dtype=bool)
+        bitmap = self._bitmaps.get((column, value))
+        if bitmap is not None:
+            n = min(size, len(bitmap))
+            mask[:n] = bitmap[:n]
+        return mask
+
+    def mask(self, where: Dict, size: int) -> np.ndarray:
+        """Filas (de las `size` primeras) que cumplen `where` / Rows (of the first `size`) matching `where`."""
+        result = np.ones(size, dtype=bool)
+        for column, condition in where.items():
+            op, values = _condition(condition)
+            column_mask = np.zeros(size, dtype=bool)
+            for value in values:
+                column_mask |= self.bitmap(column, value, size)
+            result &= column_mask if op == "$in" else ~column_mask
+        return result
+
+    def compact(self, alive: np.ndarray):
+        """Conserva solo las filas `alive`, renumeradas / Keeps only the `alive` rows, renumbered."""
+        size = int(alive[-1]) + 1 if len(alive) else 0
+        for key in list(self._bitmaps):
+            bitmap = self.bitmap(key[0], key[1], size)[alive]
+            if bitmap.any():
+                self._bitmaps[key] = bitmap
+            else:
+                del self._bitmaps[key]
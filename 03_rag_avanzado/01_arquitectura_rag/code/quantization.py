@@ -0,0 +1,126 @@
+"""
+Vector Quantization (SQ8 / PQ)
+------------------------------
+Compresión de vectores para reducir la memoria del índice:
+Vector compression to shrink index memory:
+
+- ScalarQuantizer ("sq8"): cada dimensión pasa a int8 con su propia escala y
+  offset (4x menos memoria que float32).
+  Every dimension becomes int8 with its own scale and offset (4x less memory).
+- ProductQuantizer ("pq"): el vector se parte en `m` sub-vectores y cada uno se
+  sustituye por el id (1 byte) de su centroide más cercano en un codebook.
+  The vector is split into `m` sub-vectors and each one is replaced by the id
+  (1 byte) of its closest centroid in a codebook.
+
+Los scores se calculan contra los códigos con tablas precalculadas por query
+(Asymmetric Distance Computation), sin descomprimir los vectores.
+Scores are computed against the codes with per-query lookup tables
+(Asymmetric Distance Computation), without decompressing the vectors.
+"""
+
+import numpy as np
+
+from ivf_index import kmeans
+
+_CHUNK = 65536
+
+class ScalarQuantizer:
+    """int8 por dimensión: x ≈ offset + scale * (code + 128)."""
+
+    method = "sq8"
+
+    def train(self, vectors: np.ndarray):
+        lo = np.asarray(vectors.min(axis=0), dtype=np.float32)
+        hi = np.asarray(vectors.max(axis=0), dtype=np.float32)
+        self.offset = lo
+        self.scale = np.where(hi > lo, (hi - lo) / 255, 1).astype(np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint((np.asarray(vectors, dtype=np.float32) - self.offset) / self.scale)
+        return (np.clip(codes, 0, 255) - 128).astype(np.int8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return self.offset + self.scale * (codes.astype(np.float32) + 128)
+
+    def score(self, codes: np.ndarray, query_vector: np.ndarray) -> np.ndarray:
+        # q·x ≈ q·offset + 128·Σ(q·scale) + (q·scale)·code
+        # La "tabla" es la query escalada; se calcula una vez por query.
+        # The "table" is the scaled query; computed once per query.
+        weights = query_vector * self.scale
+        bias = float(query_vector @ self.offset + 128 * weights.sum())
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), _CHUNK):
+            block = codes[start:start + _CHUNK].astype(np.float32)
+            scores[start:start + len(block)] = block @ weights
+        return scores + bias
+
+class ProductQuantizer:
+    """
+    Args:
+        m: Número de sub-vectores (bytes por vector) / Number of sub-vectors (bytes per vector).
+        n_centroids: Centroides por sub-espacio (<= 256) / Centroids per sub-space (<= 256).
+    """
+
+    method = "pq"
+
+    def __init__(self, m: int = 32, n_centroids: int = 256, n_iter: int = 15, seed: int = 0):
+        self.m = m
+        self.n_centroids = n_centroids
+        self.n_iter = n_iter
+        self.seed = seed
+
+    def train(self, vectors: np.ndarray, max_train_points: int = 20_000):
+        dim = vectors.shape[1]
+        if dim % self.m:
+            raise ValueError(f"dim ({dim}) must be divisible by m ({self.m})")
+        if len(vectors) > max_train_points:
+            rng = np.random.default_rng(self.seed)
+            vectors = vectors[np.sort(rng.choice(len(vectors), max_train_points, replace=False))]
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.n_centroids = min(self.n_centroids, len(vectors))
+        self.sub_dim = dim // self.m
+        # codebooks: (m, n_centroids, sub_dim)
+        self.codebooks = np.stack([
+            kmeans(self._sub(vectors, j), self.n_centroids, n_iter=self.n_iter, seed=self.seed)
+            for j in range(self.m)
+        ])
+
+    def _sub(self, vectors: np.ndarray, j: int) -> np.ndarray:
+        return vectors[:, j * self.sub_dim:(j + 1) * self.sub_dim]
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for j, codebook in enumerate(self.codebooks):
+            sub = self._sub(vectors, j)
+            # argmin ||x-c||² == argmax (x·c - ||c||²/2)
+            bias = -0.5 * np.einsum("ij,ij->i", codebook, codebook)
+            codes[:, j] = np.argmax(sub @ codebook.T + bias, axis=1)
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return np.concatenate([self.codebooks[j][codes[:, j]] for j in range(self.m)], axis=1)
+
+    def score(self, codes: np.ndarray, query_vector: np.ndarray) -> np.ndarray:
+        # Tabla (m, n_centroids): producto de cada sub-query con cada centroide.
+        # El score de un vector es la suma de m entradas de la tabla.
+        # Table (m, n_centroids): each sub-query dotted with each centroid.
+        # A vector's score is the sum of m table entries.
+        table = np.einsum("jcd,jd->jc", self.codebooks,
+                          query_vector.reshape(self.m, self.sub_dim).astype(np.float32))
+        flat = table.ravel()
+        shift = (np.arange(self.m) * self.n_centroids).astype(np.intp)
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), _CHUNK):
+            block = codes[start:start + _CHUNK]
+            scores[start:start + len(block)] = flat[block + shift].sum(axis=1)
+        return scores
+
+def make_quantizer(method: str, dim: int, m: int = 0, seed: int = 0):
+    if method == "sq8":
+        return ScalarQuantizer()
+    if method == "pq":
+        # Por defecto 4 dimensiones por byte: 16x menos memoria que float32
+        # Default 4 dimensions per byte: 16x less memory than float32
+        return ProductQuantizer(m=m or max(1, dim // 4), seed=seed)
+    raise ValueError(f"Unknown quantization method: {method!r}")
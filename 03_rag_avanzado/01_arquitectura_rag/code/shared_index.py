@@ -0,0 +1,177 @@
+"""
+Shared Vector Index (Multi-Worker)
+----------------------------------
+Varios procesos (workers) sirviendo el mismo índice sin multiplicar la RAM.
+El índice se publica una sola vez en disco y cada worker lo abre con
+memory-mapping de solo lectura: todos comparten las mismas páginas de la caché
+del sistema operativo, sin copias y sin volver a calcular embeddings.
+
+Several processes (workers) serving the same index without multiplying RAM.
+The index is published once on disk and every worker opens it with read-only
+memory-mapping: they all share the same OS page-cache pages, with no copies
+and no re-embedding.
+
+Publicación versionada (hot swap) / Versioned publishing (hot swap):
+    root/
+      v000001/   índice inmutable (SimpleVectorStore.export) / immutable index
+      v000002/
+      CURRENT    versión activa; se reemplaza de forma atómica / active version, replaced atomically
+
+Los workers comprueban CURRENT periódicamente y cambian de versión sin
+detenerse; las búsquedas en curso terminan con la versión anterior.
+Workers poll CURRENT and switch versions without stopping; in-flight
+searches finish on the previous version.
+"""
+
+import os
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from simple_rag_pipeline import SimpleVectorStore, get_mock_embeddings
+
+_CURRENT = "CURRENT"
+_VERSION_RE = re.compile(r"v\d{6}")
+
+def _versions(root: str) -> List[str]:
+    return sorted(name for name in os.listdir(root)
+                  if _VERSION_RE.fullmatch(name) and os.path.isdir(os.path.join(root, name)))
+
+def current_version(root: str) -> Optional[str]:
+    """Nombre de la versión activa (o None) / Name of the active version (or None)."""
+    try:
+        with open(os.path.join(root, _CURRENT)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def publish(store: SimpleVectorStore, root: str, keep: int = 2) -> str:
+    """
+    Publica una copia inmutable de `store` como nueva versión y la activa.
+    Se asume un único proceso publicador.
+    Publishes an immutable copy of `store` as a new version and activates it.
+    A single publisher process is assumed.
+
+    Args:
+        keep: Versiones que se conservan en disco (la activa incluida); las
+            anteriores se borran. En POSIX un fichero borrado sigue siendo
+            válido para los workers que aún lo tienen mapeado.
+            Versions kept on disk (active one included); older ones are
+            deleted. On POSIX a deleted file stays valid for workers that
+            still have it mapped.
+    """
+    if keep < 1:
+        raise ValueError(f"keep must be >= 1, got {keep}")
+    os.makedirs(root, exist_ok=True)
+    versions = _versions(root)
+    name = f"v{int(versions[-1][1:]) + 1 if versions else 1:06d}"
+    store.export(os.path.join(root, name))
+
+    # El índice está completo antes de apuntar CURRENT a él
+    # The index is complete before CURRENT points to it
+    tmp = os.path.join(root, _CURRENT + ".tmp")
+    with open(tmp, "w") as f:
+        f.write(name)
+    os.replace(tmp, os.path.join(root, _CURRENT))
+
+    for old in _versions(root)[:-keep]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return name
+
+class SharedIndexReader:
+    """
+    Lado del worker: mantiene abierta la versión activa (solo lectura) y
+    cambia a la nueva cuando se publica.
+    Worker side: keeps the active version open (read-only) and switches to
+    the new one when it is published.
+
+    Args:
+        root: Directorio de publicación / Publishing directory.
+        embed_fn: Embeddings de las queries (el índice no se re-vectoriza).
+            Query embeddings (the index is never re-embedded).
+        check_interval: Segundos entre comprobaciones de CURRENT.
+            Seconds between CURRENT checks.
+    """
+
+    def __init__(self, root: str,
+                 embed_fn: Callable[[List[str]], np.ndarray] = get_mock_embeddings,
+                 check_interval: float = 1.0, shards: int = 1):
+        self.root = root
+        self.embed_fn = embed_fn
+        self.check_interval = check_interval
+        self.shards = shards
+        self.version: Optional[str] = None
+        self.swaps = 0
+        self._store: Optional[SimpleVectorStore] = None
+        self._checked_at = 0.0
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """Abre la versión activa si cambió / Opens the active version if it changed."""
+        self._checked_at = time.monotonic()
+        version = current_version(self.root)
+        if version is None or version == self.version:
+            return False
+        try:
+            store = SimpleVectorStore.open(os.path.join(self.root, version), embed_fn=self.embed_fn,
+                                           shards=self.shards, read_only=True)
+        except FileNotFoundError:
+            # Versión ya retirada por el publicador: seguimos con la actual
+            # Version already retired by the publisher: keep the current one
+            return False
+        # Cambio de referencia atómico / Atomic reference swap
+        self._store, self.version = store, version
+        self.swaps += 1
+        return True
+
+    @property
+    def store(self) -> SimpleVectorStore:
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            self.refresh()
+        if self._store is None:
+            raise ValueError(f"No index has been published in {self.root!r}")
+        return self._store
+
+    def search(self, query: str, k: int = 2, **kwargs) -> List[str]:
+        return self.store.search(query, k=k, **kwargs)
+
+# --- Demo: un pool de procesos / a process pool ---
+
+_reader: Optional[SharedIndexReader] = None
+
+def _init_worker(root: str):
+    global _reader
+    _reader = SharedIndexReader(root, check_interval=0.0)
+
+def _worker_search(query: str):
+    results = _reader.search(query, k=1, mode="hybrid")
+    return os.getpid(), _reader.version, results
+
+if __name__ == "__main__":
+    root = tempfile.mkdtemp(prefix="shared_index_")
+
+    store = SimpleVectorStore()
+    store.add_documents([
+        "Python is a programming language created by Guido van Rossum.",
+        "The capital of France is Paris.",
+    ], ids=["python", "paris"])
+    print(f"📤 Published {publish(store, root)}")
+
+    queries = ["Python programming language", "capital of France"]
+    with ProcessPoolExecutor(max_workers=2, initializer=_init_worker, initargs=(root,)) as pool:
+        for pid, version, results in pool.map(_worker_search, queries):
+            print(f"  worker {pid} [{version}]: {results}")
+
+        # Hot swap: los workers siguen vivos y toman la nueva versión
+        # Hot swap: workers keep running and pick up the new version
+        store.upsert(["The capital of France is Paris, on the Seine."], ids=["paris"])
+        print(f"📤 Published {publish(store, root)}")
+        for pid, version, results in pool.map(_worker_search, queries):
+            print(f"  worker {pid} [{version}]: {results}")
+
+    shutil.rmtree(root)
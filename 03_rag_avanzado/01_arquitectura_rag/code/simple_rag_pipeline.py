@@ -5,36 +5,888 @@ Una implementación conceptual de RAG sin bases de datos complejas.
 A conceptual implementation of RAG without complex databases.
 """
 
+import heapq
+import itertools
+import json
+import mmap
+import os
 import numpy as np
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Optional, Tuple
+
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from embedding_cache import CachedEmbedder
+from ivf_index import IVFIndex
+from metadata_index import BitmapIndex, matches
+from quantization import make_quantizer
 
 # Simulación de función de embedding (normalmente usarías OpenAI o HuggingFace)
 # Mock embedding function (normally you'd use OpenAI or HuggingFace)
 def get_mock_embedding(text: str) -> np.ndarray:
-    # Retorna un vector aleatorio determinista basado en la longitud del texto
-    # Returns a deterministic random vector based on text length
-    np.random.seed(len(text))
-    return np.random.rand(128)
+    # Retorna un vector aleatorio determinista basado en la longitud del texto.
+    # Usamos un generador propio por llamada en vez de np.random.seed (estado
+    # global, no thread-safe); produce exactamente los mismos vectores.
+    # Returns a deterministic random vector based on text length.
+    # Uses a per-call generator instead of np.random.seed (global state, not
+    # thread-safe); it produces exactly the same vectors.
+    return np.random.RandomState(len(text)).rand(128)
+
+def get_mock_embeddings(texts: List[str]) -> np.ndarray:
+    """
+    Versión por lotes: una matriz (n_texts, dim). Las APIs reales (OpenAI,
+    HuggingFace) aceptan una lista de textos en una sola llamada.
+    Batch version: one (n_texts, dim) matrix. Real APIs (OpenAI, HuggingFace)
+    accept a list of texts in a single call.
+    """
+    return np.stack([get_mock_embedding(text) for text in texts])
 
 def cosine_similarity(v1: np.ndarray, v2: np.ndarray) -> float:
     return np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2))
 
+_SEARCH_MODES = ("vector", "keyword", "hybrid")
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    # Normaliza filas a norma 1 (las filas nulas quedan a cero)
+    # Normalizes rows to unit norm (zero rows stay zero)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Índices de los k mayores scores, ordenados de mayor a menor.
+    Indices of the k highest scores, sorted descending.
+
+    Usa una selección parcial (np.partition, O(n)) en lugar de ordenar todo.
+    Uses a partial selection (np.partition, O(n)) instead of a full sort.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    kth = -np.partition(-scores, k - 1)[k - 1]
+    # Incluimos todos los empates con el k-ésimo y gana el insertado antes
+    # (igual que el sort estable del modo "list")
+    # Keep every tie with the k-th score; earliest inserted wins
+    # (same as the stable sort of "list" mode)
+    candidates = np.flatnonzero(scores >= kth)
+    order = np.lexsort((candidates, -scores[candidates]))
+    top = candidates[order[:k]]
+    # -inf marca filas excluidas (p. ej. borradas) / -inf marks excluded rows (e.g. deleted)
+    return top[scores[top] > -np.inf]
+
+def _append_rows(buffer: Optional[np.ndarray], size: int, rows: np.ndarray) -> np.ndarray:
+    """
+    Añade `rows` tras las `size` filas ocupadas de `buffer`, creciendo x2 cuando
+    se llena para que añadir sea O(1) amortizado.
+    Appends `rows` after the `size` used rows of `buffer`, growing x2 when full
+    so appending is amortized O(1).
+    """
+    needed = size + len(rows)
+    if buffer is None:
+        buffer = np.empty((max(needed, 16),) + rows.shape[1:], dtype=rows.dtype)
+    elif needed > len(buffer):
+        grown = np.empty((max(needed, 2 * len(buffer)),) + buffer.shape[1:], dtype=buffer.dtype)
+        grown[:size] = buffer[:size]
+        buffer = grown
+    buffer[size:needed] = rows
+    return buffer
+
+class _MappedTexts:
+    """
+    Textos guardados en disco: bytes UTF-8 concatenados + offsets de fin (int64).
+    Texts stored on disk: concatenated UTF-8 bytes + end offsets (int64).
+
+    Solo se decodifica el texto que se pide; nada se carga entero en RAM.
+    Only the requested text is decoded; nothing is fully loaded into RAM.
+    """
+
+    def __init__(self, texts_path: str, offsets_path: str, count: int):
+        self._count = count
+        self._offsets = (np.memmap(offsets_path, dtype=np.int64, mode="r", shape=(count,))
+                         if count else np.empty(0, dtype=np.int64))
+        self._data = b""
+        if count and self._offsets[-1] > 0:
+            with open(texts_path, "rb") as f:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i: int) -> str:
+        if not -self._count <= i < self._count:
+            raise IndexError(i)
+        i %= self._count
+        start = int(self._offsets[i - 1]) if i > 0 else 0
+        return self._data[start:int(self._offsets[i])].decode("utf-8")
+
+    @property
+    def nbytes(self) -> int:
+        return int(self._offsets[-1]) if self._count else 0
+
+    def all(self) -> List[str]:
+        """Todos los textos con una sola lectura / Every text with a single read."""
+        data = self._data[:self.nbytes]
+        ends = self._offsets.tolist()
+        return [data[start:end].decode("utf-8") for start, end in zip([0] + ends[:-1], ends)]
+
 class SimpleVectorStore:
-    def __init__(self):
+    """
+    Vector store en memoria con dos modos de almacenamiento:
+    In-memory vector store with two storage modes:
+
+    - "matrix" (por defecto/default): matriz float32 contigua y pre-normalizada;
+      la búsqueda es un único producto matriz-vector + top-k parcial.
+    - "list": la versión didáctica original, una lista de dicts con un bucle
+      de similitud coseno por documento.
+
+    `embed_fn` (lista de textos -> matriz) permite enchufar cualquier modelo de
+    embeddings, p. ej. un `CachedEmbedder` para no recalcular vectores.
+    `embed_fn` (list of texts -> matrix) plugs in any embedding model, e.g. a
+    `CachedEmbedder` to avoid recomputing vectors.
+
+    `shards` > 1 reparte los escaneos completos entre varios hilos (uno por
+    shard) para usar varios núcleos; los resultados no cambian.
+    `shards` > 1 spreads full scans over several threads (one per shard) to
+    use several cores; results do not change.
+    """
+
+    # Filas mínimas por shard: por debajo, el coste de coordinar hilos domina
+    # Minimum rows per shard: below this, thread coordination dominates
+    min_shard_size = 16_384
+
+    def __init__(self, storage: str = "matrix",
+                 embed_fn: Callable[[List[str]], np.ndarray] = get_mock_embeddings,
+                 shards: int = 1):
+        if storage not in ("matrix", "list"):
+            raise ValueError(f"Unknown storage mode: {storage!r}")
+        if shards < 1:
+            raise ValueError(f"shards must be >= 1, got {shards}")
+        self.storage = storage
+        self.embed_fn = embed_fn
+        self.shards = shards
+        self._pool: Optional[ThreadPoolExecutor] = None
         self.documents: List[Dict] = []
-    
-    def add_documents(self, texts: List[str]):
-        for text in texts:
-            vector = get_mock_embedding(text)
-            self.documents.append({"text": text, "vector": vector})
-            
-    def search(self, query: str, k: int = 2) -> List[str]:
-        query_vector = get_mock_embedding(query)
+        self._texts: List[str] = []
+        self._vectors: Optional[np.ndarray] = None
+        self._size = 0
+        # Directorio en disco al que está ligado el store (ver save/open)
+        # On-disk directory the store is bound to (see save/open)
+        self._path: Optional[str] = None
+        # Abierto con open(read_only=True): compartido entre procesos, sin escrituras
+        # Opened with open(read_only=True): shared across processes, no writes
+        self._read_only = False
+        # Índice aproximado opcional (ver build_index) / Optional ANN index (see build_index)
+        self._index: Optional[IVFIndex] = None
+        # Vectores comprimidos opcionales (ver quantize) / Optional compressed vectors (see quantize)
+        self._quantizer = None
+        self._codes: Optional[np.ndarray] = None
+        self._keep_vectors = True
+        # Ids estables y tombstones (ver upsert/delete/compact)
+        # Stable ids and tombstones (see upsert/delete/compact)
+        self._ids: List[str] = []
+        self._id_to_row: Dict[str, int] = {}
+        self._deleted: Optional[np.ndarray] = None
+        self._n_deleted = 0
+        # False tras open(): ids y metadatos siguen en disco hasta que algo los
+        # necesita (escrituras, filtros where); una búsqueda simple no los carga
+        # False after open(): ids and metadata stay on disk until something needs
+        # them (writes, where filters); a plain search never loads them
+        self._docs_loaded = True
+        # Metadatos por fila + bitmaps por (columna, valor) para filtrar (where=...)
+        # Per-row metadata + bitmaps per (column, value) for filtering (where=...)
+        self._metadatas: List[Dict] = []
+        self._bitmaps = BitmapIndex()
+        # Índice BM25 para mode="keyword"/"hybrid"; se construye en el primer uso
+        # BM25 index for mode="keyword"/"hybrid"; built on first use
+        self._bm25: Optional[BM25Index] = None
+
+    def __len__(self) -> int:
+        # Documentos vivos (sin contar tombstones) / Live documents (tombstones excluded)
+        if self.storage == "list":
+            return len(self.documents)
+        return self._size - self._n_deleted
+
+    def add_documents(self, texts: List[str], ids: Optional[List[str]] = None,
+                      metadatas: Optional[List[Dict]] = None):
+        """
+        Añade documentos nuevos. Sin `ids` se generan ids numéricos ("0", "1", ...).
+        `metadatas` (p. ej. {"source": "doc1"}) permite filtrar luego con `where`.
+        Adds new documents. Without `ids`, numeric ids ("0", "1", ...) are generated.
+        `metadatas` (e.g. {"source": "doc1"}) allows filtering later with `where`.
+        """
+        self._check_writable()
+        if ids is not None and len(ids) != len(texts):
+            raise ValueError("texts and ids must have the same length")
+        metadatas = self._check_metadatas(metadatas, len(texts))
+        if self.storage == "list":
+            for i, text in enumerate(texts):
+                vector = self.embed_fn([text])[0]
+                doc_id = ids[i] if ids is not None else str(len(self.documents))
+                self.documents.append({"id": doc_id, "text": text, "vector": vector,
+                                       "metadata": metadatas[i]})
+            return
+
+        if not texts:
+            return
+        self._load_docs()
+        ids = self._new_ids(len(texts)) if ids is None else [str(doc_id) for doc_id in ids]
+        taken = [doc_id for doc_id in ids if doc_id in self._id_to_row]
+        if taken or len(set(ids)) != len(ids):
+            raise ValueError(f"Duplicate ids {taken[:5]}; use upsert() to replace documents")
+        vectors = _normalize(self.embed_fn(texts))
+        self._append(vectors, texts, ids, metadatas)
+
+    @staticmethod
+    def _check_metadatas(metadatas: Optional[List[Dict]], n: int) -> List[Dict]:
+        if metadatas is None:
+            return [{} for _ in range(n)]
+        if len(metadatas) != n:
+            raise ValueError("texts and metadatas must have the same length")
+        return [dict(metadata or {}) for metadata in metadatas]
+
+    def upsert(self, texts: List[str], ids: List[str],
+               metadatas: Optional[List[Dict]] = None) -> Dict[str, int]:
+        """
+        Inserta o reemplaza documentos por id. Solo se re-vectorizan los textos
+        que cambiaron; la fila antigua queda como tombstone hasta compact().
+        Inserts or replaces documents by id. Only changed texts are re-embedded;
+        the old row stays as a tombstone until compact().
+        """
+        if self.storage != "matrix":
+            raise ValueError("upsert requires storage='matrix'")
+        self._check_writable()
+        if len(ids) != len(texts):
+            raise ValueError("texts and ids must have the same length")
+
+        metadatas = self._check_metadatas(metadatas, len(texts))
+        self._load_docs()
+
+        stats = {"inserted": 0, "updated": 0, "unchanged": 0}
+        changed: Dict[str, Tuple[str, Dict]] = {}
+        replaced = []
+        # Si un id se repite, gana el último / If an id repeats, the last one wins
+        for doc_id, (text, metadata) in dict(zip(map(str, ids), zip(texts, metadatas))).items():
+            row = self._id_to_row.get(doc_id)
+            if row is None:
+                stats["inserted"] += 1
+            elif self._texts[row] == text and self._metadatas[row] == metadata:
+                stats["unchanged"] += 1
+                continue
+            else:
+                stats["updated"] += 1
+                replaced.append(row)
+            changed[doc_id] = (text, metadata)
+
+        if changed:
+            # Primero se escriben las filas nuevas y después se marcan las antiguas
+            # New rows are written first and old rows are tombstoned afterwards
+            new_texts = [text for text, _ in changed.values()]
+            self._append(_normalize(self.embed_fn(new_texts)), new_texts, list(changed),
+                         [metadata for _, metadata in changed.values()])
+            self._tombstone(replaced)
+        return stats
+
+    def delete(self, ids: List[str]) -> int:
+        """
+        Borra documentos por id con tombstones (la fila se ignora en las
+        búsquedas). Devuelve cuántos existían.
+        Deletes documents by id using tombstones (the row is skipped by searches).
+        Returns how many existed.
+        """
+        if self.storage != "matrix":
+            raise ValueError("delete requires storage='matrix'")
+        self._check_writable()
+        self._load_docs()
+        rows = [self._id_to_row.pop(str(doc_id)) for doc_id in ids if str(doc_id) in self._id_to_row]
+        self._tombstone(rows)
+        return len(rows)
+
+    def compact(self) -> int:
+        """
+        Elimina físicamente las filas borradas/reemplazadas y recupera el espacio.
+        Devuelve el número de filas eliminadas.
+        Physically removes deleted/replaced rows and reclaims their space.
+        Returns the number of removed rows.
+        """
+        self._check_writable()
+        if self._n_deleted == 0:
+            return 0
+        self._load_docs()
+        alive = np.flatnonzero(~self._deleted[:self._size])
+        removed = self._size - len(alive)
+        vectors = self.vectors[alive] if self._keep_vectors else None
+        texts = [self._texts[i] for i in alive]
+        ids = [self._ids[i] for i in alive]
+        metadatas = [self._metadatas[i] for i in alive]
+
+        if self._path is not None:
+            # Se escribe un índice nuevo al lado y se intercambian los ficheros
+            # (meta.json el último, como punto de commit)
+            # A new index is written next to it and files are swapped in
+            # (meta.json last, as the commit point)
+            path, tmp = self._path, self._path.rstrip(os.sep) + ".compact"
+            self._write_fresh(tmp, vectors, texts, ids, metadatas)
+            for name in self._FILES + ("meta.json",):
+                os.replace(os.path.join(tmp, name), os.path.join(path, name))
+            os.rmdir(tmp)
+            self._path = path
+            self._remap()
+        else:
+            self._vectors = vectors
+            self._texts = texts
+            self._deleted = np.zeros(len(alive), dtype=bool)
+            self._size = len(alive)
+
+        old_to_new = np.full(removed + len(alive), -1, dtype=np.int64)
+        old_to_new[alive] = np.arange(len(alive))
+        if self._codes is not None:
+            self._codes = self._codes[alive]
+        if self._index is not None:
+            self._index.remap(old_to_new)
+        self._bitmaps.compact(alive)
+        if self._bm25 is not None:
+            self._bm25.compact(old_to_new)
+        self._metadatas = metadatas
+        self._ids = ids
+        self._id_to_row = {doc_id: row for row, doc_id in enumerate(ids)}
+        self._n_deleted = 0
+        return removed
+
+    def _check_writable(self):
+        if self._read_only:
+            raise ValueError("Store was opened with read_only=True; publish a new version instead")
+
+    def _new_ids(self, n: int) -> List[str]:
+        ids, candidate = [], self._size
+        while len(ids) < n:
+            if str(candidate) not in self._id_to_row:
+                ids.append(str(candidate))
+            candidate += 1
+        return ids
+
+    def _tombstone(self, rows: List[int]):
+        if not rows:
+            return
+        self._deleted[rows] = True
+        self._n_deleted += len(rows)
+        if self._bm25 is not None:
+            self._bm25.remove([self._texts[row] for row in rows])
+        if isinstance(self._deleted, np.memmap):
+            self._deleted.flush()
+
+    def _mask_deleted(self, scores: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        # Las filas con tombstone nunca entran en el top-k
+        # Tombstoned rows never make it into the top-k
+        if self._n_deleted:
+            deleted = self._deleted[:self._size] if rows is None else self._deleted[rows]
+            scores[..., deleted] = -np.inf
+        return scores
+
+    def _append(self, vectors: np.ndarray, texts: List[str], ids: List[str],
+                metadatas: List[Dict]):
+        first_row = self._size
+        if self._quantizer is not None:
+            self._codes = _append_rows(self._codes, self._size, self._quantizer.encode(vectors))
+        if self._path is not None:
+            self._append_to_disk(vectors, texts, ids, metadatas)
+        else:
+            if self._keep_vectors:
+                self._vectors = _append_rows(self._vectors, self._size, vectors)
+            self._deleted = _append_rows(self._deleted, self._size, np.zeros(len(texts), dtype=bool))
+            self._texts.extend(texts)
+            self._size += len(texts)
+        self._ids.extend(ids)
+        self._id_to_row.update(zip(ids, range(first_row, first_row + len(ids))))
+        self._metadatas.extend(metadatas)
+        self._bitmaps.add(first_row, metadatas)
+        if self._bm25 is not None:
+            self._bm25.add(texts)
+
+    # --- Persistencia / Persistence ---
+    #
+    # Formato del directorio / Directory layout:
+    #   vectors.f32  filas float32 normalizadas, en crudo / raw normalized float32 rows
+    #   texts.bin    textos UTF-8 concatenados / concatenated UTF-8 texts
+    #   offsets.i64  offset de fin de cada texto / end offset of each text
+    #   ids.bin      ids UTF-8 concatenados / concatenated UTF-8 ids
+    #   ids.i64      offset de fin de cada id / end offset of each id
+    #   metadata.bin metadatos JSON concatenados, uno por fila / concatenated JSON metadata, one per row
+    #   metadata.i64 offset de fin de cada metadato / end offset of each metadata
+    #   deleted.u8   tombstone por fila (0/1), se actualiza in-place / per-row tombstone, updated in place
+    #   meta.json    {"dim", "count"}; se escribe al final (punto de commit)
+    #                written last (commit point)
+
+    _FILES = ("vectors.f32", "texts.bin", "offsets.i64", "ids.bin", "ids.i64",
+              "metadata.bin", "metadata.i64", "deleted.u8")
+
+    def save(self, path: str):
+        """
+        Guarda el índice en `path` y liga el store a ese directorio: cada
+        add_documents posterior se añade al final de los ficheros, sin reescribirlos.
+        Saves the index to `path` and binds the store to that directory: every
+        later add_documents is appended to the files, never rewriting them.
+        """
+        if self.storage != "matrix":
+            raise ValueError("Persistence requires storage='matrix'")
+        if self._path is not None and os.path.abspath(path) == os.path.abspath(self._path):
+            return  # Ya persistido (escritura inmediata) / Already persisted (write-through)
+
+        self._write_fresh(path, *self._snapshot())
+
+    def export(self, path: str):
+        """
+        Escribe una copia del índice en `path` sin ligar el store a ella: la
+        copia es inmutable y se puede abrir con open(read_only=True) desde
+        otros procesos (ver shared_index.py).
+        Writes a copy of the index to `path` without binding the store to it:
+        the copy is immutable and can be opened with open(read_only=True) from
+        other processes (see shared_index.py).
+        """
+        if self.storage != "matrix":
+            raise ValueError("Persistence requires storage='matrix'")
+        SimpleVectorStore(embed_fn=self.embed_fn)._write_fresh(path, *self._snapshot())
+
+    def _snapshot(self) -> Tuple[np.ndarray, List[str], List[str], List[Dict], Optional[np.ndarray]]:
+        self._load_docs()
+        deleted = np.array(self._deleted[:self._size]) if self._size else None
+        return (self.vectors, [self._texts[i] for i in range(self._size)],
+                list(self._ids), list(self._metadatas), deleted)
+
+    def _write_fresh(self, path: str, vectors: np.ndarray, texts: List[str], ids: List[str],
+                     metadatas: List[Dict], deleted: Optional[np.ndarray] = None):
+        # Crea un índice vacío en `path`, liga el store a él y escribe todas las filas
+        # Creates an empty index at `path`, binds the store to it and writes every row
+        os.makedirs(path, exist_ok=True)
+        for name in self._FILES:
+            open(os.path.join(path, name), "wb").close()
+        self._write_meta(path, None, 0)
+        self._path, self._vectors, self._texts, self._deleted = path, None, [], None
+        self._read_only = False
+        self._size = 0
+        self._remap()
+        if texts:
+            self._append_to_disk(vectors, texts, ids, metadatas, deleted)
+
+    @classmethod
+    def open(cls, path: str,
+             embed_fn: Callable[[List[str]], np.ndarray] = get_mock_embeddings,
+             shards: int = 1, read_only: bool = False) -> "SimpleVectorStore":
+        """
+        Abre un índice guardado con memory-mapping: es casi instantáneo y las
+        páginas del fichero solo se leen cuando la búsqueda las toca.
+        Opens a saved index with memory-mapping: almost instant, and file pages
+        are only read when a search touches them.
+
+        Los ids y metadatos no se leen hasta la primera escritura o filtro `where`.
+        Ids and metadata are not read until the first write or `where` filter.
+
+        Con `read_only=True` ningún fichero se abre en escritura: varios procesos
+        pueden abrir el mismo índice y comparten las mismas páginas de la caché
+        del sistema operativo (una sola copia de la matriz en RAM).
+        With `read_only=True` no file is opened for writing: several processes
+        can open the same index and share the same OS page-cache pages (a single
+        copy of the matrix in RAM).
+        """
+        store = cls(storage="matrix", embed_fn=embed_fn, shards=shards)
+        store._path = path
+        store._read_only = read_only
+        store._remap()
+        store._n_deleted = int(np.count_nonzero(store._deleted)) if store._size else 0
+        store._docs_loaded = False
+        return store
+
+    def _load_docs(self):
+        """
+        Carga ids y metadatos de disco en bloque (una lectura y un json.loads por
+        fichero) y construye el mapa id -> fila y los bitmaps.
+        Bulk-loads ids and metadata from disk (one read and one json.loads per
+        file) and builds the id -> row map and the bitmaps.
+        """
+        if self._docs_loaded:
+            return
+        ids = self._mapped_ids.all()
+        metadatas = json.loads("[" + ",".join(self._mapped_metadata.all()) + "]")
+        bitmaps = BitmapIndex()
+        bitmaps.add(0, metadatas)
+        deleted = np.asarray(self._deleted[:self._size]) if self._size else np.zeros(0, dtype=bool)
+        alive = np.flatnonzero(~deleted).tolist()
+        self._ids, self._metadatas, self._bitmaps = ids, metadatas, bitmaps
+        self._id_to_row = dict(zip([ids[row] for row in alive], alive))
+        self._docs_loaded = True
+
+    def _where_mask(self, where: Dict) -> np.ndarray:
+        self._load_docs()
+        return self._bitmaps.mask(where, self._size)
+
+    @staticmethod
+    def _write_meta(path: str, dim: Optional[int], count: int):
+        tmp = os.path.join(path, "meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"dim": dim, "count": count}, f)
+        os.replace(tmp, os.path.join(path, "meta.json"))
+
+    def _remap(self):
+        with open(os.path.join(self._path, "meta.json")) as f:
+            meta = json.load(f)
+        count, dim = meta["count"], meta["dim"]
+        self._size = count
+        self._vectors = (np.memmap(os.path.join(self._path, "vectors.f32"), dtype=np.float32,
+                                   mode="r", shape=(count, dim))
+                         if count else None)
+        # Los tombstones son lo único que se modifica in-place (r+)
+        # Tombstones are the only thing modified in place (r+)
+        self._deleted = (np.memmap(os.path.join(self._path, "deleted.u8"), dtype=bool,
+                                   mode="r" if self._read_only else "r+", shape=(count,))
+                         if count else None)
+        self._texts = _MappedTexts(os.path.join(self._path, "texts.bin"),
+                                   os.path.join(self._path, "offsets.i64"), count)
+        self._mapped_ids = _MappedTexts(os.path.join(self._path, "ids.bin"),
+                                        os.path.join(self._path, "ids.i64"), count)
+        self._mapped_metadata = _MappedTexts(os.path.join(self._path, "metadata.bin"),
+                                             os.path.join(self._path, "metadata.i64"), count)
+
+    def _append_to_disk(self, vectors: np.ndarray, texts: List[str], ids: List[str],
+                        metadatas: List[Dict], deleted: Optional[np.ndarray] = None):
+        # Solo se escribe al final de cada fichero (append); meta.json marca
+        # cuántas filas son válidas, así que una escritura interrumpida no
+        # corrompe el índice.
+        # Only appends to the end of each file; meta.json records how many rows
+        # are valid, so an interrupted write does not corrupt the index.
+        count = self._size
+        if deleted is None:
+            deleted = np.zeros(len(texts), dtype=bool)
+        dim = vectors.shape[1]
+        if count and dim != self._vectors.shape[1]:
+            raise ValueError(f"Dimension mismatch: index has {self._vectors.shape[1]}, got {dim}")
+
+        payloads = [("vectors.f32", count * dim * 4, np.asarray(vectors, dtype=np.float32).tobytes())]
+        # Textos, ids y metadatos: bytes concatenados + offsets de fin (acceso por fila)
+        # Texts, ids and metadata: concatenated bytes + end offsets (per-row access)
+        columns = [
+            ("texts.bin", "offsets.i64", self._texts, texts),
+            ("ids.bin", "ids.i64", self._mapped_ids, ids),
+            ("metadata.bin", "metadata.i64", self._mapped_metadata,
+             [json.dumps(metadata, separators=(",", ":")) for metadata in metadatas]),
+        ]
+        for data_name, offsets_name, mapped, values in columns:
+            encoded = [value.encode("utf-8") for value in values]
+            ends = mapped.nbytes + np.cumsum([len(b) for b in encoded], dtype=np.int64)
+            payloads += [(data_name, mapped.nbytes, b"".join(encoded)),
+                         (offsets_name, count * 8, ends.tobytes())]
+        payloads.append(("deleted.u8", count, np.asarray(deleted, dtype=bool).tobytes()))
+        for name, committed_size, payload in payloads:
+            with open(os.path.join(self._path, name), "r+b") as f:
+                # Truncamos restos de una escritura previa sin commit
+                # Drop leftovers from a previous uncommitted write
+                f.truncate(committed_size)
+                f.seek(committed_size)
+                f.write(payload)
+        self._write_meta(self._path, dim, count + len(texts))
+        self._remap()
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Vista (sin copia) de las filas ocupadas / View (no copy) of the used rows."""
+        if not self._keep_vectors:
+            raise ValueError("Full-precision vectors were dropped by quantize(keep_vectors=False)")
+        if self._vectors is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self._vectors[:self._size]
+
+    def build_index(self, n_lists: Optional[int] = None, nprobe: Optional[int] = None,
+                    n_iter: int = 20, seed: int = 0):
+        """
+        Construye un índice IVF (k-means + listas invertidas) sobre los vectores.
+        Builds an IVF index (k-means + inverted lists) over the vectors.
+
+        Args:
+            n_lists: Número de clusters; por defecto ~sqrt(n) / Number of clusters; default ~sqrt(n).
+            nprobe: Listas visitadas por defecto en search / Lists visited by default in search.
+        """
+        if self.storage != "matrix":
+            raise ValueError("build_index requires storage='matrix'")
+        if self._size == 0:
+            raise ValueError("Cannot build an index on an empty store")
+        n_lists = n_lists or max(1, int(np.sqrt(self._size)))
+        index = IVFIndex(min(n_lists, self._size), nprobe or max(1, n_lists // 10))
+        index.train(self.vectors, n_iter=n_iter, seed=seed)
+        index.add(self.vectors)
+        self._index = index
+
+    def quantize(self, method: str = "sq8", m: int = 0, keep_vectors: bool = True,
+                 k: int = 10, seed: int = 0) -> Dict:
+        """
+        Comprime los vectores: "sq8" (int8 por dimensión, 4x) o "pq"
+        (product quantization, `m` bytes por vector; por defecto dim/4 -> 16x).
+        Compresses the vectors: "sq8" (int8 per dimension, 4x) or "pq"
+        (product quantization, `m` bytes per vector; default dim/4 -> 16x).
+
+        Con `keep_vectors=False` se liberan los float32 de la RAM (sin re-score
+        exacto, salvo que el store esté en disco, ver save/open).
+        With `keep_vectors=False` the float32 vectors are freed from RAM (no exact
+        re-score, unless the store lives on disk, see save/open).
+
+        Returns:
+            Informe con compresión y recall@k medido / Report with compression and measured recall@k.
+        """
+        if self.storage != "matrix":
+            raise ValueError("quantize requires storage='matrix'")
+        if self._size == 0:
+            raise ValueError("Cannot quantize an empty store")
+        vectors = self.vectors
+        quantizer = make_quantizer(method, vectors.shape[1], m=m, seed=seed)
+        quantizer.train(vectors)
+        self._codes = _append_rows(None, 0, quantizer.encode(vectors))
+        self._quantizer = quantizer
+
+        code_bytes = self._codes[0].nbytes
+        self.quantization_report = {
+            "method": method,
+            "bytes_per_vector": code_bytes,
+            "compression": vectors.shape[1] * 4 / code_bytes,
+            f"recall@{k}": self.recall_at_k(k=k, seed=seed),
+        }
+        if not keep_vectors and self._path is None:
+            self._keep_vectors = False
+            self._vectors = None
+        return self.quantization_report
+
+    def recall_at_k(self, queries: Optional[List[str]] = None, k: int = 10,
+                    nprobe: Optional[int] = None, rescore: int = 0,
+                    n_samples: int = 100, seed: int = 0) -> float:
+        """
+        Fracción del top-k exacto (fuerza bruta) que recupera la búsqueda actual
+        (IVF y/o cuantizada). Sin `queries`, usa una muestra de vectores guardados.
+        Fraction of the exact (brute force) top-k that the current search
+        (IVF and/or quantized) retrieves. Without `queries`, uses a sample of stored vectors.
+        """
+        if queries is None:
+            rng = np.random.default_rng(seed)
+            sample = rng.choice(self._size, min(n_samples, self._size), replace=False)
+            query_vectors = np.asarray(self.vectors[np.sort(sample)])
+        else:
+            query_vectors = _normalize(self.embed_fn(queries))
+
+        found = 0
+        for query_vector in query_vectors:
+            exact = _top_k(self._mask_deleted(self.vectors @ query_vector), k)
+            approx = self._search_vector(query_vector, k, nprobe, rescore)
+            found += len(np.intersect1d(exact, approx))
+        return found / (len(query_vectors) * min(k, self._size))
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Bytes en RAM de vectores y códigos / RAM bytes of vectors and codes."""
+        in_ram = (self._keep_vectors and self._vectors is not None
+                  and not isinstance(self._vectors, np.memmap))
+        return {
+            "vectors": self.vectors.nbytes if in_ram else 0,
+            "codes": self._codes[:self._size].nbytes if self._codes is not None else 0,
+        }
+
+    # Candidatos que aporta cada retriever a la fusión híbrida
+    # Candidates each retriever contributes to the hybrid fusion
+    hybrid_candidates = 50
+
+    def search(self, query: str, k: int = 2, nprobe: Optional[int] = None,
+               rescore: int = 0, where: Optional[Dict] = None,
+               mode: str = "vector") -> List[str]:
+        """
+        Devuelve los k textos más similares a la query.
+        Returns the k texts most similar to the query.
+
+        Si hay un índice IVF (build_index), solo se puntúan las `nprobe` listas
+        más cercanas (por defecto, el nprobe del índice); si no, fuerza bruta exacta.
+        If there is an IVF index (build_index), only the `nprobe` closest lists are
+        scored (by default, the index's nprobe); otherwise exact brute force.
+
+        Si el store está cuantizado (quantize), `rescore` > 0 re-puntúa con los
+        vectores exactos los `rescore` mejores candidatos aproximados.
+        If the store is quantized (quantize), `rescore` > 0 re-scores the best
+        `rescore` approximate candidates with the exact vectors.
+
+        `where` (p. ej. {"source": "doc1"}) restringe la búsqueda, vía bitmaps,
+        a las filas cuyos metadatos cumplen el filtro antes de puntuar.
+        `where` (e.g. {"source": "doc1"}) restricts the search, via bitmaps, to
+        the rows whose metadata match the filter before scoring.
+
+        `mode`: "vector" (semántica / semantic), "keyword" (BM25) o/or "hybrid"
+        (ambas fusionadas con Reciprocal Rank Fusion / both fused with RRF).
+        """
+        if mode not in _SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode!r}")
+        if self.storage == "list":
+            if mode != "vector":
+                raise ValueError(f"mode={mode!r} requires storage='matrix'")
+            return self._search_list(query, k, where)
+
+        if self._size == 0:
+            return []
+        query_vector = _normalize(self.embed_fn([query])[0]) if mode != "keyword" else None
+        return [self._texts[i]
+                for i in self._search_one(query, query_vector, k, nprobe, rescore, where, mode)]
+
+    def search_many(self, queries: List[str], k: int = 2, nprobe: Optional[int] = None,
+                    rescore: int = 0, where: Optional[Dict] = None,
+                    mode: str = "vector") -> List[List[str]]:
+        """
+        Búsqueda por lotes: vectoriza todas las queries en una llamada y las
+        puntúa contra el corpus con un único producto matriz-matriz (BLAS).
+        Batch search: embeds every query in one call and scores them against
+        the corpus with a single matrix-matrix product (BLAS).
+
+        Returns:
+            Una lista top-k por query, igual que `search` / One top-k list per query, same as `search`.
+        """
+        if mode not in _SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode!r}")
+        if self.storage == "list":
+            return [self.search(query, k, nprobe, rescore, where, mode) for query in queries]
+
+        if self._size == 0 or not queries:
+            return [[] for _ in queries]
+        query_vectors = (_normalize(self.embed_fn(queries)) if mode != "keyword"
+                         else [None] * len(queries))
+
+        if (mode == "vector" and self._index is None and nprobe is None
+                and self._quantizer is None):
+            rows = self._filter_rows(where)
+            vectors = self.vectors if rows is None else self.vectors[rows]
+            # (n_queries, dim) @ (dim, n_docs) -> (n_queries, n_docs)
+            scores = self._mask_deleted(query_vectors @ vectors.T, rows)
+            tops = [_top_k(row, k) for row in scores]
+            return [[self._texts[i] for i in (top if rows is None else rows[top])]
+                    for top in tops]
+
+        # IVF / cuantizado / BM25: cada query usa sus propios candidatos y tablas
+        # IVF / quantized / BM25: each query uses its own candidates and tables
+        return [[self._texts[i] for i in self._search_one(query, query_vector, k, nprobe,
+                                                          rescore, where, mode)]
+                for query, query_vector in zip(queries, query_vectors)]
+
+    def _search_one(self, query: str, query_vector: Optional[np.ndarray], k: int,
+                    nprobe: Optional[int], rescore: int, where: Optional[Dict],
+                    mode: str) -> np.ndarray:
+        if mode == "vector":
+            return self._search_vector(query_vector, k, nprobe, rescore, where)
+        if mode == "keyword":
+            return self._search_keyword(query, k, where)
+        n = max(k, self.hybrid_candidates)
+        return reciprocal_rank_fusion([self._search_vector(query_vector, n, nprobe, rescore, where),
+                                       self._search_keyword(query, n, where)], k)
+
+    def _search_keyword(self, query: str, k: int, where: Optional[Dict] = None) -> np.ndarray:
+        # Top-k BM25: solo se tocan las posting lists de los términos de la query
+        # BM25 top-k: only the posting lists of the query terms are touched
+        if self._bm25 is None:
+            self._bm25 = BM25Index()
+            self._bm25.add([self._texts[i] for i in range(self._size)])
+            if self._n_deleted:
+                self._bm25.remove([self._texts[i] for i in np.flatnonzero(self._deleted[:self._size])])
+        rows, scores = self._bm25.score(query)
+        if where:
+            keep = self._where_mask(where)[rows]
+            rows, scores = rows[keep], scores[keep]
+        return rows[_top_k(self._mask_deleted(scores, rows), k)]
+
+    def _search_vector(self, query_vector: np.ndarray, k: int, nprobe: Optional[int],
+                       rescore: int, where: Optional[Dict] = None) -> np.ndarray:
+        # Filas del top-k para un vector de query ya normalizado
+        # Top-k rows for an already normalized query vector
+        rows = self._candidate_rows(query_vector, nprobe, where)
+        rescore = rescore if self._quantizer is not None else 0
+        n = max(rescore, k)
+        if rows is None:
+            top = self._scan_top_k(query_vector, n)
+        else:
+            top = rows[_top_k(self._score_block(query_vector, rows), n)]
+        if not rescore:
+            return top
+
+        # Re-score exacto de los mejores candidatos / Exact re-score of the best candidates
+        shortlist = np.sort(top)
+        return shortlist[_top_k(self.vectors[shortlist] @ query_vector, k)]
+
+    def _score_block(self, query_vector: np.ndarray, block) -> np.ndarray:
+        """
+        Scores de un bloque de filas (slice o array de filas), con las borradas a -inf.
+        Scores for a block of rows (slice or row array), deleted rows set to -inf.
+        """
+        if self._quantizer is None:
+            # Vectores pre-normalizados: el coseno es un simple producto punto
+            # Pre-normalized vectors: cosine is just a dot product
+            scores = self.vectors[block] @ query_vector
+        else:
+            scores = self._quantizer.score(self._codes[:self._size][block], query_vector)
+        if self._n_deleted:
+            scores[self._deleted[:self._size][block]] = -np.inf
+        return scores
+
+    def _scan_top_k(self, query_vector: np.ndarray, k: int) -> np.ndarray:
+        """
+        Top-k de un escaneo completo. Con `shards > 1` la matriz se parte en
+        rangos de filas contiguos que se puntúan en paralelo (NumPy libera el
+        GIL en el producto matriz-vector) y los top-k de cada shard se mezclan
+        con un heap. El resultado es idéntico al de un solo shard: cada shard
+        ordena por (-score, fila) igual que `_top_k`.
+        Top-k of a full scan. With `shards > 1` the matrix is split into
+        contiguous row ranges scored in parallel (NumPy releases the GIL in the
+        matrix-vector product) and the per-shard top-k lists are merged with a
+        heap. The result is identical to a single shard: every shard sorts by
+        (-score, row) just like `_top_k`.
+        """
+        n_shards = min(self.shards, self._size // self.min_shard_size)
+        if n_shards <= 1:
+            return _top_k(self._score_block(query_vector, slice(0, self._size)), k)
+
+        def scan_shard(start: int, stop: int) -> List[Tuple[float, int]]:
+            scores = self._score_block(query_vector, slice(start, stop))
+            top = _top_k(scores, k)
+            return list(zip((-scores[top]).tolist(), (top + start).tolist()))
+
+        bounds = np.linspace(0, self._size, n_shards + 1).astype(np.int64).tolist()
+        shard_results = self._shard_pool().map(scan_shard, bounds[:-1], bounds[1:])
+        merged = heapq.merge(*shard_results)
+        return np.array([row for _, row in itertools.islice(merged, k)], dtype=np.int64)
+
+    def _shard_pool(self) -> ThreadPoolExecutor:
+        # Pool creado en el primer escaneo con shards / Pool created on the first sharded scan
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.shards,
+                                            thread_name_prefix="vector-shard")
+        return self._pool
+
+    def _candidate_rows(self, query_vector: np.ndarray, nprobe: Optional[int],
+                        where: Optional[Dict] = None) -> Optional[np.ndarray]:
+        # None significa "todas las filas" / None means "every row"
+        if self._index is None:
+            if nprobe is not None:
+                raise ValueError("nprobe requires an index; call build_index() first")
+            return self._filter_rows(where)
+        rows = self._index.candidates(query_vector, nprobe)
+        # Las filas añadidas después de build_index se recorren siempre
+        # Rows added after build_index are always scanned
+        if self._index.n_indexed < self._size:
+            rows = np.concatenate((rows, np.arange(self._index.n_indexed, self._size)))
+        if where:
+            rows = rows[self._where_mask(where)[rows]]
+        return rows
+
+    def _filter_rows(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        # Con un filtro selectivo solo se puntúan (pocas) filas: más rápido, no más lento
+        # With a selective filter only a few rows are scored: faster, not slower
+        if not where:
+            return None
+        return np.flatnonzero(self._where_mask(where))
+
+    def _search_list(self, query: str, k: int, where: Optional[Dict] = None) -> List[str]:
+        query_vector = self.embed_fn([query])[0]
         
         # Calcular similitud con todos los documentos
         # Calculate similarity with all documents
         scores = []
         for doc in self.documents:
+            if where and not matches(doc["metadata"], where):
+                continue
             score = cosine_similarity(query_vector, doc["vector"])
             scores.append((score, doc["text"]))
             
@@ -54,16 +906,56 @@ if __name__ == "__main__":
     ]
     
     # 2. Indexación / Indexing
-    db = SimpleVectorStore()
-    db.add_documents(knowledge_base)
+    # Caché de embeddings: re-indexar textos ya vistos no recalcula nada
+    # Embedding cache: re-indexing already seen texts computes nothing
+    embedder = CachedEmbedder(get_mock_embedding, batch_fn=get_mock_embeddings, max_entries=1000)
+    db = SimpleVectorStore(embed_fn=embedder)
+    db.add_documents(knowledge_base, metadatas=[
+        {"topic": "tech"}, {"topic": "geo"}, {"topic": "bio"}, {"topic": "tech"}
+    ])
     print("✅ Knowledge Base Indexed.")
+    SimpleVectorStore(embed_fn=embedder).add_documents(knowledge_base)
+    print(f"♻️  Re-indexed with cache: {embedder.stats()}")
     
     # 3. Búsqueda / Retrieval
     query = "Tell me about coding languages"
     print(f"\n🔎 Query: {query}")
     
     results = db.search(query)
+
+    # Varias queries a la vez: un solo producto matriz-matriz
+    # Several queries at once: a single matrix-matrix product
+    batch_results = db.search_many([query, "Where is Paris?"], k=1)
     
     print("\n--- Retrieved Context ---")
     for i, res in enumerate(results):
         print(f"{i+1}. {res}")
+    print(f"\n📦 Batch search (k=1): {batch_results}")
+
+    # Filtro por metadatos (bitmaps) / Metadata filter (bitmaps)
+    print(f"🏷️  Filtered search (topic=geo): {db.search(query, where={'topic': 'geo'})}")
+
+    # Búsqueda híbrida: BM25 (palabras clave) + vectores, fusionados con RRF
+    # Hybrid search: BM25 (keywords) + vectors, fused with RRF
+    print(f"🔀 Hybrid search: {db.search('Python programming language', mode='hybrid')}")
+
+    # 4. Persistencia / Persistence
+    import tempfile
+    index_dir = os.path.join(tempfile.mkdtemp(), "kb_index")
+    db.save(index_dir)
+    reopened = SimpleVectorStore.open(index_dir, embed_fn=embedder)  # memory-mapped, sin re-embeddings
+    print(f"\n💾 Saved to {index_dir} and reopened: {reopened.search(query) == results}")
+
+    # 5. Índice aproximado (IVF) / Approximate index (IVF)
+    db.build_index(n_lists=2)
+    print(f"\n⚡ IVF search (nprobe=1): {db.search(query, nprobe=1)}")
+
+    # 6. Actualizaciones y borrados por id / Updates and deletes by id
+    db.upsert(["The capital of France is Paris, on the Seine."], ids=["1"])
+    db.delete(["2"])
+    print(f"\n✏️  After upsert/delete: {len(db)} live docs, {db.compact()} rows compacted")
+
+    # 7. Vectores comprimidos (int8) / Compressed vectors (int8)
+    report = db.quantize("sq8", k=2)
+    print(f"\n🗜️  Quantized: {report}")
+    print(f"   Search with exact re-score: {db.search(query, rescore=4)}")
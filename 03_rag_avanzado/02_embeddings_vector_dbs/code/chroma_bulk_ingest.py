@@ -0,0 +1,209 @@
+"""
+ChromaDB Bulk Ingestion
+-----------------------
+Carga masiva de documentos en una colección de ChromaDB:
+Bulk loading of documents into a ChromaDB collection:
+
+1. Lector en streaming (JSONL, una línea por chunk): nunca se carga el corpus entero.
+   Streaming reader (JSONL, one line per chunk): the corpus is never fully loaded.
+2. Pool de workers que calcula embeddings en lotes configurables.
+   Worker pool that computes embeddings in configurable batches.
+3. Escrituras `upsert`/`add` agrupadas hasta el tamaño máximo de lote de Chroma.
+   `upsert`/`add` writes grouped up to Chroma's max batch size.
+4. Checkpoint tras cada escritura: una carga interrumpida continúa donde se quedó.
+   Checkpoint after every write: an interrupted load resumes where it stopped.
+
+Requisitos/Requirements:
+pip install chromadb
+"""
+
+import itertools
+import json
+import os
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+import chromadb
+from chromadb.utils import embedding_functions
+
+# Límite por defecto de SQLite en Chroma si el cliente no lo expone
+# Chroma's default SQLite limit when the client does not expose it
+_DEFAULT_MAX_BATCH = 5461
+
+def read_jsonl(path: str, skip: int = 0) -> Iterator[Dict]:
+    """
+    Lee {"id", "text", "metadata"} línea a línea / Reads {"id", "text", "metadata"} line by line.
+
+    Args:
+        skip: Registros iniciales que se saltan sin parsear el JSON (reanudación).
+            Leading records skipped without parsing their JSON (resume).
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            if skip:
+                skip -= 1
+                continue
+            yield json.loads(line)
+
+def max_batch_size(client) -> int:
+    # El nombre cambia entre versiones de chromadb / The name changes across chromadb versions
+    getter = getattr(client, "get_max_batch_size", None)
+    if getter is not None:
+        return getter()
+    return getattr(client, "max_batch_size", _DEFAULT_MAX_BATCH)
+
+def _load_checkpoint(path: Optional[str]) -> int:
+    if path is None or not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        return json.load(f)["done"]
+
+def _save_checkpoint(path: Optional[str], done: int):
+    if path is None:
+        return
+    # Escritura atómica: un corte nunca deja un checkpoint a medias
+    # Atomic write: a crash never leaves a half-written checkpoint
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"done": done}, f)
+    os.replace(tmp, path)
+
+def bulk_ingest(collection, records: Union[str, Iterable[Dict]],
+                embed_fn: Callable[[List[str]], List[List[float]]],
+                embed_batch_size: int = 64, write_batch_size: int = _DEFAULT_MAX_BATCH,
+                workers: int = 4, checkpoint_path: Optional[str] = None,
+                op: str = "upsert", report_every: int = 10_000) -> Dict:
+    """
+    Ingiere `records` en `collection` en paralelo, con checkpoint y reanudación.
+    Ingests `records` into `collection` in parallel, with checkpoint and resume.
+
+    Args:
+        records: Ruta a un JSONL (al reanudar, las líneas ya cargadas se saltan
+            sin parsearlas) o un iterable de registros.
+            Path to a JSONL file (on resume, already loaded lines are skipped
+            without parsing them) or an iterable of records.
+        embed_fn: Lista de textos -> lista de vectores (p. ej. una embedding
+            function de Chroma o la API de OpenAI).
+            List of texts -> list of vectors (e.g. a Chroma embedding function
+            or the OpenAI API).
+        write_batch_size: Registros por llamada a Chroma; usa `max_batch_size(client)`.
+            Records per Chroma call; use `max_batch_size(client)`.
+        workers: Hilos calculando embeddings (las APIs remotas y ONNX liberan el GIL).
+            Threads computing embeddings (remote APIs and ONNX release the GIL).
+        op: "upsert" (idempotente, recomendado para reanudar) o "add".
+            "upsert" (idempotent, recommended for resuming) or "add".
+
+    Returns:
+        {"ingested", "skipped", "seconds", "docs_per_sec"}
+    """
+    if op not in ("upsert", "add"):
+        raise ValueError(f"Unknown op: {op!r}")
+    write = getattr(collection, op)
+
+    # Reanudar: se saltan los registros ya confirmados en el checkpoint
+    # Resume: skip the records already committed in the checkpoint
+    done = _load_checkpoint(checkpoint_path)
+    if isinstance(records, str):
+        records = read_jsonl(records, skip=done)
+    else:
+        records = itertools.islice(iter(records), done, None)
+    skipped, ingested = done, 0
+    buffer: Dict[str, list] = {"ids": [], "embeddings": [], "documents": [], "metadatas": []}
+    start = time.perf_counter()
+    next_report = report_every
+
+    def embed(batch: List[Dict]):
+        return batch, embed_fn([record["text"] for record in batch])
+
+    def flush():
+        nonlocal done, ingested, next_report
+        if not buffer["ids"]:
+            return
+        # Chroma rechaza los dicts vacíos pero acepta None dentro de la lista
+        # (chromadb >= 0.4, ver tests/test_chroma_bulk_ingest.py); sin
+        # ningún metadato se omite la lista entera
+        # Chroma rejects empty dicts but accepts None inside the list
+        # (chromadb >= 0.4, see tests/test_chroma_bulk_ingest.py); with no
+        # metadata at all the whole list is omitted
+        metadatas = buffer["metadatas"] if any(buffer["metadatas"]) else None
+        write(ids=buffer["ids"], embeddings=buffer["embeddings"],
+              documents=buffer["documents"], metadatas=metadatas)
+        done += len(buffer["ids"])
+        ingested += len(buffer["ids"])
+        _save_checkpoint(checkpoint_path, done)
+        for values in buffer.values():
+            values.clear()
+        if ingested >= next_report:
+            rate = ingested / (time.perf_counter() - start)
+            print(f"  📥 {done} documents committed ({rate:.0f} docs/sec)")
+            next_report += report_every
+
+    batches = iter(lambda: list(itertools.islice(records, embed_batch_size)), [])
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Ventana acotada de lotes en vuelo; se consumen en orden para que el
+        # checkpoint sea siempre un prefijo del stream
+        # Bounded window of in-flight batches; consumed in order so the
+        # checkpoint is always a prefix of the stream
+        pending = deque(pool.submit(embed, batch)
+                        for batch in itertools.islice(batches, 2 * workers))
+        while pending:
+            batch, vectors = pending.popleft().result()
+            next_batch = next(batches, None)
+            if next_batch is not None:
+                pending.append(pool.submit(embed, next_batch))
+
+            for record, vector in zip(batch, vectors):
+                buffer["ids"].append(str(record["id"]))
+                buffer["embeddings"].append(list(map(float, vector)))
+                buffer["documents"].append(record["text"])
+                buffer["metadatas"].append(record.get("metadata") or None)
+                if len(buffer["ids"]) >= write_batch_size:
+                    flush()
+        flush()
+
+    seconds = time.perf_counter() - start
+    return {
+        "ingested": ingested,
+        "skipped": skipped,
+        "seconds": seconds,
+        "docs_per_sec": ingested / seconds if seconds > 0 else 0.0,
+    }
+
+if __name__ == "__main__":
+    workdir = tempfile.mkdtemp(prefix="chroma_bulk_")
+    corpus_path = os.path.join(workdir, "chunks.jsonl")
+    checkpoint_path = os.path.join(workdir, "ingest.checkpoint.json")
+
+    # Corpus de ejemplo en JSONL / Sample JSONL corpus
+    topics = ["engineering", "steak and wine", "vector databases", "travel"]
+    with open(corpus_path, "w", encoding="utf-8") as f:
+        for i in range(2000):
+            f.write(json.dumps({"id": f"chunk-{i}",
+                                "text": f"Chunk {i}: a short note about {topics[i % len(topics)]}.",
+                                "metadata": {"topic": topics[i % len(topics)]}}) + "\n")
+
+    try:
+        client = chromadb.PersistentClient(path=os.path.join(workdir, "chroma"))
+        collection = client.get_or_create_collection(name="bulk_knowledge_base")
+        embed_fn = embedding_functions.DefaultEmbeddingFunction()
+
+        print("--- Bulk ingestion ---")
+        stats = bulk_ingest(collection, corpus_path, embed_fn,
+                            embed_batch_size=128, write_batch_size=min(1000, max_batch_size(client)),
+                            checkpoint_path=checkpoint_path, report_every=1000)
+        print(f"✅ {stats['ingested']} docs in {stats['seconds']:.1f}s "
+              f"({stats['docs_per_sec']:.0f} docs/sec)")
+
+        # Segunda ejecución: el checkpoint indica que no queda nada por cargar
+        # Second run: the checkpoint says there is nothing left to load
+        stats = bulk_ingest(collection, corpus_path, embed_fn,
+                            checkpoint_path=checkpoint_path)
+        print(f"♻️  Resumed run: skipped {stats['skipped']}, ingested {stats['ingested']}")
+        print(f"📦 Collection size: {collection.count()}")
+    except Exception as e:
+        print(f"❌ Error: {e}")
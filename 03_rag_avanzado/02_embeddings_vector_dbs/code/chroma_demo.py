@@ -9,6 +9,9 @@ pip install chromadb
 """
 
 import chromadb
+from chromadb.utils import embedding_functions
+
+from embedding_batcher import EmbeddingBatcher
 
 def chroma_example():
     print("--- ChromaDB Vector Store ---")
@@ -17,12 +20,19 @@ def chroma_example():
     # Ephemeral client (in-memory) for testing
     client = chromadb.Client()
     
+    # Chroma usa un modelo de embedding por defecto (all-MiniLM-L6-v2) si no especificas uno.
+    # Lo envolvemos en un micro-batcher: las consultas concurrentes de varios
+    # hilos se agrupan en una sola llamada al modelo.
+    # We wrap it in a micro-batcher: concurrent queries from several threads
+    # are grouped into a single model call.
+    embedder = EmbeddingBatcher(embedding_functions.DefaultEmbeddingFunction(),
+                                max_batch_size=32, max_wait_ms=5)
+
     # Crear una colección (como una tabla SQL)
     # Create a collection (like a SQL table)
-    collection = client.create_collection(name="my_knowledge_base")
+    collection = client.create_collection(name="my_knowledge_base", embedding_function=embedder)
     
     # Agregar documentos
-    # Chroma usa un modelo de embedding por defecto (all-MiniLM-L6-v2) si no especificas uno
     print("Adding documents...")
     collection.add(
         documents=[
@@ -45,6 +55,7 @@ def chroma_example():
     print("\n--- Result ---")
     print(f"Document: {results['documents'][0][0]}")
     print(f"Distance: {results['distances'][0][0]}")
+    print(f"Embedding batches: {embedder.stats()}")
 
 if __name__ == "__main__":
     try:
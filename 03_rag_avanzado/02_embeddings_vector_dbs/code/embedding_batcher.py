@@ -0,0 +1,200 @@
+"""
+Dynamic Micro-Batching for Embeddings
+-------------------------------------
+Las APIs de embeddings aceptan lotes grandes, pero el código suele llamarlas
+con un texto cada vez: la sobrecarga por petición (red, cola del proveedor)
+domina la latencia. El micro-batcher junta las peticiones concurrentes de
+muchos llamadores durante como mucho `max_wait_ms` (o hasta `max_batch_size`
+textos), hace una sola llamada por lotes y devuelve a cada llamador su vector.
+
+Embedding APIs accept large batches, but code usually calls them one text at
+a time: per-request overhead (network, provider queue) dominates latency. The
+micro-batcher gathers concurrent requests from many callers for at most
+`max_wait_ms` (or up to `max_batch_size` texts), makes a single batched call
+and hands each caller back its vector.
+
+Sirve desde hilos (`embed`), desde asyncio (`aembed`) y como embedding
+function de Chroma (`batcher(input=[...])`).
+Works from threads (`embed`), from asyncio (`aembed`) and as a Chroma
+embedding function (`batcher(input=[...])`).
+"""
+
+import asyncio
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+class EmbeddingBatcher:
+    """
+    Args:
+        embed_fn: Lista de textos -> lista/matriz de vectores (una llamada a la API).
+            List of texts -> list/matrix of vectors (one API call).
+        max_batch_size: Textos por llamada como máximo / Maximum texts per call.
+        max_wait_ms: Espera máxima del primer texto de un lote antes de enviarlo.
+            Maximum wait of a batch's first text before it is sent.
+        max_in_flight: Llamadas por lotes simultáneas. Con todas ocupadas, los
+            textos se acumulan y el siguiente lote sale más grande.
+            Simultaneous batched calls. With all of them busy, texts pile up
+            and the next batch goes out bigger.
+    """
+
+    def __init__(self, embed_fn: Callable[[List[str]], Sequence], max_batch_size: int = 64,
+                 max_wait_ms: float = 5.0, max_in_flight: int = 4):
+        self.embed_fn = embed_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.batch_sizes: Counter = Counter()
+        self._queue: queue.Queue = queue.Queue()
+        self._slots = threading.Semaphore(max_in_flight)
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight)
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, text: str) -> Future:
+        future: Future = Future()
+        self._queue.put(([text], future, True))
+        return future
+
+    def submit_many(self, texts: List[str]) -> Future:
+        """
+        Encola `texts` como una sola unidad: van juntos en el mismo lote y el
+        Future devuelve la lista de vectores.
+        Queues `texts` as a single unit: they travel together in the same batch
+        and the Future returns the list of vectors.
+        """
+        future: Future = Future()
+        self._queue.put((list(texts), future, False))
+        return future
+
+    def embed(self, text: str):
+        """Bloquea hasta tener el vector de `text` / Blocks until `text`'s vector is ready."""
+        return self.submit(text).result()
+
+    async def aembed(self, text: str):
+        return await asyncio.wrap_future(self.submit(text))
+
+    def __call__(self, input: List[str]) -> List:
+        # Firma de embedding function de Chroma. La lista ya es un lote: no se
+        # trocea, solo se junta con lo que llegue a la vez.
+        # Chroma embedding function signature. The list is already a batch: it
+        # is not split, only joined with whatever arrives at the same time.
+        return self.submit_many(input).result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            self._slots.acquire()
+            # El reloj empieza con el primer texto: ninguno espera más de max_wait_ms
+            # The clock starts with the first text: none waits longer than max_wait_ms
+            deadline = time.monotonic() + self.max_wait_ms / 1000
+            size = len(batch[0][0])
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+                size += len(batch[-1][0])
+            self._pool.submit(self._flush, batch)
+
+    def _flush(self, batch: List):
+        try:
+            # Los solicitantes que ya cancelaron (p. ej. aembed) se quedan fuera;
+            # al resto ya no se les puede cancelar
+            # Callers that already cancelled (e.g. aembed) are left out; the rest
+            # can no longer be cancelled
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                return
+            texts = [text for item_texts, _, _ in batch for text in item_texts]
+            self.batch_sizes[len(texts)] += 1
+            try:
+                vectors = self.embed_fn(texts)
+                if len(vectors) != len(texts):
+                    raise ValueError(f"embed_fn returned {len(vectors)} vectors for {len(texts)} texts")
+                outcomes, start = [], 0
+                for item_texts, _, single in batch:
+                    item_vectors = list(vectors[start:start + len(item_texts)])
+                    start += len(item_texts)
+                    outcomes.append(item_vectors[0] if single else item_vectors)
+            except Exception as e:
+                # Todo el lote falla junto / The whole batch fails together
+                for _, future, _ in batch:
+                    self._resolve(future.set_exception, e)
+                return
+        finally:
+            self._slots.release()
+        for (_, future, _), outcome in zip(batch, outcomes):
+            self._resolve(future.set_result, outcome)
+
+    @staticmethod
+    def _resolve(set_outcome: Callable, value):
+        # Un Future ya resuelto no debe impedir resolver los demás del lote
+        # An already-resolved Future must not stop the rest of the batch
+        try:
+            set_outcome(value)
+        except InvalidStateError:
+            pass
+
+    def stats(self) -> Dict:
+        """
+        Histograma de tamaños de lote ("<=8": lotes de 5 a 8 textos).
+        Batch-size histogram ("<=8": batches of 5 to 8 texts).
+        """
+        batches = sum(self.batch_sizes.values())
+        items = sum(size * count for size, count in self.batch_sizes.items())
+        histogram: Counter = Counter()
+        for size, count in self.batch_sizes.items():
+            histogram[1 << (size - 1).bit_length()] += count
+        return {"batches": batches, "items": items,
+                "mean_batch_size": items / batches if batches else 0.0,
+                "histogram": {f"<={upper}": histogram[upper] for upper in sorted(histogram)}}
+
+if __name__ == "__main__":
+    def get_mock_embeddings(texts: List[str]) -> np.ndarray:
+        # Como get_mock_embeddings del Módulo 3.1 / Like get_mock_embeddings in Module 3.1
+        return np.stack([np.random.RandomState(len(text)).rand(128) for text in texts])
+
+    connections = threading.Semaphore(4)
+
+    def mock_embedding_api(texts: List[str]) -> np.ndarray:
+        # 20 ms de sobrecarga por llamada + 0.1 ms por texto, 4 conexiones como máximo
+        # 20 ms of overhead per call + 0.1 ms per text, at most 4 connections
+        with connections:
+            time.sleep(0.020 + 0.0001 * len(texts))
+            return get_mock_embeddings(texts)
+
+    texts = [f"Query number {i} about vector databases" for i in range(400)]
+
+    print("--- One call per text (32 threads) ---")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        unbatched = list(pool.map(lambda text: mock_embedding_api([text])[0], texts))
+    print(f"⏱️  {len(texts)} embeddings in {time.perf_counter() - start:.2f}s")
+
+    print("\n--- Micro-batched (32 threads) ---")
+    batcher = EmbeddingBatcher(mock_embedding_api, max_batch_size=64, max_wait_ms=5)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        batched = list(pool.map(batcher.embed, texts))
+    print(f"⏱️  {len(texts)} embeddings in {time.perf_counter() - start:.2f}s")
+    print(f"✅ Same vectors: {all(np.array_equal(a, b) for a, b in zip(unbatched, batched))}")
+    print(f"📊 {batcher.stats()}")
+
+    print("\n--- Micro-batched (asyncio) ---")
+
+    async def main():
+        return await asyncio.gather(*(batcher.aembed(text) for text in texts))
+
+    batcher.batch_sizes.clear()
+    start = time.perf_counter()
+    asyncio.run(main())
+    print(f"⏱️  {len(texts)} embeddings in {time.perf_counter() - start:.2f}s")
+    print(f"📊 {batcher.stats()}")
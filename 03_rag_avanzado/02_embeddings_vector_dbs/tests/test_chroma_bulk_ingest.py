@@ -0,0 +1,53 @@
+import json
+import uuid
+
+import pytest
+
+chromadb = pytest.importorskip("chromadb")
+
+from chromadb.api.types import validate_metadatas  # noqa: E402
+
+from chroma_bulk_ingest import bulk_ingest, read_jsonl  # noqa: E402
+
+def embed(texts):
+    return [[float(len(text)), 1.0, 0.0] for text in texts]
+
+def write_corpus(path, n, broken_prefix=0):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            if i < broken_prefix:
+                # Solo se puede saltar, no parsear / Can only be skipped, not parsed
+                f.write("{not json\n")
+                continue
+            record = {"id": f"chunk-{i}", "text": f"Chunk {i}"}
+            if i % 2:
+                record["metadata"] = {"topic": "odd"}
+            f.write(json.dumps(record) + "\n")
+
+def new_collection():
+    return chromadb.EphemeralClient().create_collection(f"test-{uuid.uuid4().hex}")
+
+def test_chroma_accepts_none_but_not_empty_metadata():
+    # Contrato del que depende flush() / Contract flush() relies on
+    validate_metadatas([{"topic": "odd"}, None])
+    with pytest.raises(ValueError):
+        validate_metadatas([{"topic": "odd"}, {}])
+
+def test_mixed_metadata_is_ingested(tmp_path):
+    corpus = tmp_path / "chunks.jsonl"
+    write_corpus(corpus, 10)
+    collection = new_collection()
+    stats = bulk_ingest(collection, str(corpus), embed, embed_batch_size=3, write_batch_size=4)
+    assert stats["ingested"] == 10
+    assert collection.count() == 10
+    assert collection.get(ids=["chunk-1"])["metadatas"] == [{"topic": "odd"}]
+
+def test_resume_skips_committed_lines_without_parsing(tmp_path):
+    corpus, checkpoint = tmp_path / "chunks.jsonl", tmp_path / "ckpt.json"
+    write_corpus(corpus, 10, broken_prefix=4)
+    checkpoint.write_text(json.dumps({"done": 4}))
+    collection = new_collection()
+    stats = bulk_ingest(collection, str(corpus), embed, checkpoint_path=str(checkpoint))
+    assert (stats["skipped"], stats["ingested"]) == (4, 6)
+    assert json.loads(checkpoint.read_text())["done"] == 10
+    assert len(list(read_jsonl(str(corpus), skip=4))) == 6
@@ -0,0 +1,47 @@
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from embedding_batcher import EmbeddingBatcher
+
+def fake_api(texts):
+    time.sleep(0.01)
+    return np.array([[float(len(text)), 1.0] for text in texts])
+
+@pytest.mark.parametrize("embed_fn", [
+    lambda texts: fake_api(texts)[:-1],                # Falta un vector / One vector missing
+    lambda texts: (vector for vector in fake_api(texts)),  # Sin len() ni slicing / No len() nor slicing
+])
+def test_bad_embed_fn_output_fails_every_caller(embed_fn):
+    batcher = EmbeddingBatcher(embed_fn, max_wait_ms=20)
+    futures = [batcher.submit(f"text {i}") for i in range(4)]
+    for future in futures:
+        assert future.exception(timeout=2) is not None
+
+def test_list_input_is_one_unit():
+    calls = []
+
+    def api(texts):
+        calls.append(len(texts))
+        return fake_api(texts)
+
+    batcher = EmbeddingBatcher(api, max_batch_size=32)
+    vectors = batcher([f"text {i}" for i in range(100)])
+    assert len(vectors) == 100
+    assert calls == [100]
+
+def test_cancelled_async_caller_does_not_block_the_batch():
+    batcher = EmbeddingBatcher(fake_api, max_wait_ms=20)
+
+    async def main():
+        cancelled = asyncio.ensure_future(batcher.aembed("gone"))
+        others = [asyncio.ensure_future(batcher.aembed(f"text {i}")) for i in range(3)]
+        await asyncio.sleep(0.005)
+        cancelled.cancel()
+        return await asyncio.wait_for(asyncio.gather(*others), 2)
+
+    vectors = asyncio.run(main())
+    assert [vector[0] for vector in vectors] == [6.0, 6.0, 6.0]
+    assert batcher.stats()["items"] == 3
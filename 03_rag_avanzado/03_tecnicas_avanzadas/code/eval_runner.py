@@ -0,0 +1,188 @@
+"""
+Cached Evaluation Runner
+------------------------
+Ejecuta métricas LLM-as-a-Judge (p. ej. Ragas) fila a fila con:
+Runs LLM-as-a-Judge metrics (e.g. Ragas) row by row with:
+
+- Concurrencia acotada (asyncio.Semaphore): nunca más de `max_concurrency`
+  llamadas al juez a la vez.
+  Bounded concurrency (asyncio.Semaphore): never more than `max_concurrency`
+  judge calls at once.
+- Caché persistente (SQLite) indexada por hash(métrica, pregunta, respuesta,
+  contextos, ground truth): al repetir la evaluación solo se pagan las filas
+  que cambiaron.
+  Persistent cache (SQLite) keyed by hash(metric, question, answer, contexts,
+  ground truth): re-runs only pay for the rows that changed.
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import pandas as pd
+
+# (nombre de la métrica, fila) -> score / (metric name, row) -> score
+ScoreFn = Callable[[str, Dict], Awaitable[float]]
+
+class CachedEvaluationRunner:
+    """
+    Args:
+        score_fn: Corrutina que puntúa una fila con una métrica (ver `ragas_score_fn`).
+            Coroutine scoring one row with one metric (see `ragas_score_fn`).
+        cache_path: Fichero SQLite; None = sin caché persistente.
+            SQLite file; None = no persistent cache.
+        max_concurrency: Llamadas simultáneas al juez / Simultaneous judge calls.
+        namespace: Modelo juez; evita mezclar scores de jueces distintos.
+            Judge model; keeps scores from different judges apart.
+    """
+
+    def __init__(self, score_fn: ScoreFn, cache_path: Optional[str] = None,
+                 max_concurrency: int = 8, namespace: str = "default"):
+        self.score_fn = score_fn
+        self.max_concurrency = max_concurrency
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._db = sqlite3.connect(cache_path or ":memory:")
+        self._db.execute("CREATE TABLE IF NOT EXISTS scores (key TEXT PRIMARY KEY, score REAL)")
+        self._db.commit()
+
+    def key(self, metric: str, row: Dict) -> str:
+        payload = json.dumps([self.namespace, metric, row.get("question"), row.get("answer"),
+                              row.get("contexts"), row.get("ground_truth")], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def evaluate(self, data: Dict[str, list], metrics: List[str]) -> pd.DataFrame:
+        """
+        Versión síncrona de `aevaluate`. Dentro de un event loop (Jupyter) usa
+        `await runner.aevaluate(...)`.
+        Synchronous version of `aevaluate`. Inside an event loop (Jupyter) use
+        `await runner.aevaluate(...)`.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.aevaluate(data, metrics))
+        raise RuntimeError("evaluate() cannot run inside a running event loop (e.g. Jupyter); "
+                           "use `await runner.aevaluate(data, metrics)` instead")
+
+    async def aevaluate(self, data: Dict[str, list], metrics: List[str]) -> pd.DataFrame:
+        """
+        Devuelve un DataFrame con la forma de `results.to_pandas()` de Ragas:
+        las columnas de `data` más una columna por métrica (NaN si falló).
+        Returns a DataFrame shaped like Ragas' `results.to_pandas()`: the
+        `data` columns plus one column per metric (NaN on failure).
+        """
+        df = pd.DataFrame(data)
+        rows = df.to_dict("records")
+        keys = {(metric, i): self.key(metric, row) for metric in metrics for i, row in enumerate(rows)}
+        cached = self._load(list(set(keys.values())))
+        self.hits += sum(1 for key in keys.values() if key in cached)
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def judge(metric: str, row: Dict, key: str) -> None:
+            async with semaphore:
+                try:
+                    score = float(await self.score_fn(metric, row))
+                except Exception as e:  # Como raise_exceptions=False en Ragas / Like raise_exceptions=False in Ragas
+                    self.errors += 1
+                    print(f"⚠️  {metric} failed: {e}")
+                    return
+            cached[key] = score
+            self._store(key, score)
+
+        # Filas repetidas (misma clave) se juzgan una sola vez / Repeated rows (same key) are judged once
+        missing = {key: (metric, rows[i]) for (metric, i), key in keys.items() if key not in cached}
+        self.misses += len(missing)
+        await asyncio.gather(*(judge(metric, row, key) for key, (metric, row) in missing.items()))
+
+        for metric in metrics:
+            df[metric] = [cached.get(keys[(metric, i)], float("nan")) for i in range(len(rows))]
+        return df
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+    def _load(self, keys: List[str]) -> Dict[str, float]:
+        found = {}
+        # SQLite limita el número de parámetros por consulta
+        # SQLite limits the number of parameters per query
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self._db.execute(f"SELECT key, score FROM scores WHERE key IN "
+                                    f"({','.join('?' * len(chunk))})", chunk)
+            found.update(rows)
+        return found
+
+    def _store(self, key: str, score: float):
+        # Se guarda cada score al llegar: una ejecución interrumpida no pierde trabajo
+        # Each score is saved as it arrives: an interrupted run loses no work
+        self._db.execute("INSERT OR REPLACE INTO scores VALUES (?, ?)", (key, score))
+        self._db.commit()
+
+def ragas_score_fn(metrics: list) -> ScoreFn:
+    """
+    Adapta métricas de Ragas a `score_fn`. Las métricas se inicializan con el
+    LLM y los embeddings por defecto (OpenAI), igual que hace `evaluate`.
+    Adapts Ragas metrics to `score_fn`. Metrics are initialized with the
+    default LLM and embeddings (OpenAI), just like `evaluate` does.
+    """
+    from ragas.embeddings import embedding_factory
+    from ragas.llms import llm_factory
+    from ragas.run_config import RunConfig
+
+    by_name = {}
+    for metric in metrics:
+        if hasattr(metric, "llm") and metric.llm is None:
+            metric.llm = llm_factory()
+        if hasattr(metric, "embeddings") and metric.embeddings is None:
+            metric.embeddings = embedding_factory()
+        metric.init(RunConfig())
+        by_name[metric.name] = metric
+
+    async def score(metric_name: str, row: Dict) -> float:
+        metric = by_name[metric_name]
+        if hasattr(metric, "single_turn_ascore"):
+            # Ragas >= 0.2
+            from ragas import SingleTurnSample
+            sample = SingleTurnSample(user_input=row["question"], response=row["answer"],
+                                      retrieved_contexts=row["contexts"],
+                                      reference=row.get("ground_truth"))
+            return await metric.single_turn_ascore(sample)
+        return await metric.ascore(row)
+
+    return score
+
+if __name__ == "__main__":
+    calls = 0
+
+    async def mock_judge(metric: str, row: Dict) -> float:
+        # Juez simulado: ~0.1 s por llamada / Simulated judge: ~0.1 s per call
+        global calls
+        calls += 1
+        await asyncio.sleep(0.1)
+        words = set(row["answer"].lower().split())
+        context = " ".join(row["contexts"]).lower()
+        return sum(word in context for word in words) / max(len(words), 1)
+
+    data = {
+        "question": [f"Question {i}?" for i in range(40)],
+        "answer": [f"Answer number {i} about Paris." for i in range(40)],
+        "contexts": [[f"Paris is the capital of France. Fact {i}."] for i in range(40)],
+        "ground_truth": ["Paris"] * 40,
+    }
+    runner = CachedEvaluationRunner(mock_judge, max_concurrency=10)
+
+    for attempt in ("first run", "re-run", "re-run with 2 changed rows"):
+        if attempt == "re-run with 2 changed rows":
+            data["answer"][:2] = ["Paris.", "The capital is Paris."]
+        calls, start = 0, time.perf_counter()
+        df = runner.evaluate(data, ["faithfulness", "answer_relevancy"])
+        print(f"🧪 {attempt}: {calls} judge calls in {time.perf_counter() - start:.2f}s, "
+              f"mean faithfulness {df['faithfulness'].mean():.3f}")
+    print(f"📊 Cache: {runner.stats()}")
@@ -5,23 +5,29 @@ Demonostración de cómo evaluar pipelines de RAG usando métricas de Ragas.
 Demonstrates how to evaluate RAG pipelines using Ragas metrics.
 
 Requisitos/Requirements:
-pip install ragas datasets
+pip install ragas
 """
 
 import os
-import pandas as pd
-from datasets import Dataset
 try:
-    from ragas import evaluate
     from ragas.metrics import (
         faithfulness,
         answer_relevancy,
         context_precision,
         context_recall,
     )
+    RAGAS_AVAILABLE = True
 except ImportError:
-    print("Ragas not installed. Please run: pip install ragas datasets")
-    exit()
+    # Las métricas offline siguen funcionando sin Ragas
+    # Offline metrics still work without Ragas
+    RAGAS_AVAILABLE = False
+
+from eval_runner import CachedEvaluationRunner, ragas_score_fn
+from retrieval_metrics import METRICS, check_gate, retrieval_metrics
+
+# La caché vive junto al script, no en el directorio desde el que se ejecuta
+# The cache lives next to the script, not in the directory it is run from
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ragas_cache.sqlite")
 
 # Datos de Ejemplo / Dummy Data
 # En un caso real, esto vendría de tu pipeline de RAG (logs de producción o set de test).
@@ -49,9 +55,26 @@ data = {
     ]
 }
 
-def run_evaluation():
+def run_evaluation(cache_path: str = DEFAULT_CACHE_PATH):
     print("--- Starting RAG Evaluation ---")
-    
+
+    # 0. Gate barato: métricas de recuperación sin LLM (segundos para todo el dataset).
+    # Si el retrieval ya falla, no merece la pena pagar al juez.
+    # Cheap gate: retrieval metrics without an LLM (seconds for the whole dataset).
+    # If retrieval already fails, paying the judge is not worth it.
+    offline = retrieval_metrics(data, k=5)
+    print("\n--- Offline Retrieval Metrics ---")
+    print(offline[METRICS].mean().round(3).to_string())
+    failed = check_gate(offline, {"hit_rate": 0.6, "mrr": 0.5})
+    if failed:
+        print(f"❌ Retrieval gate failed: {failed}. Skipping LLM-as-a-Judge metrics.")
+        return
+    print("✅ Retrieval gate passed")
+
+    if not RAGAS_AVAILABLE:
+        print("\n⚠️  Ragas not installed. Please run: pip install ragas")
+        return
+
     # Ragas usa OpenAI por defecto para evaluar (LLM-as-a-Judge)
     if not os.getenv("OPENAI_API_KEY"):
         print("⚠️  OPENAI_API_KEY missing. Ragas needs an LLM judge to run.")
@@ -59,29 +82,25 @@ def run_evaluation():
         print("   Set it with: export OPENAI_API_KEY='sk-...'")
         return
 
-    # 1. Convertir a formato Dataset de HuggingFace
-    dataset = Dataset.from_dict(data)
-    
+    metrics = [faithfulness, answer_relevancy, context_precision, context_recall]
     print("Evaluating dataset with metrics: Faithfulness, Answer Relevancy, Precision, Recall...")
     
-    # 2. Correr Evaluación
-    # raise_exceptions=False ayuda a continuar si una métrica falla puntualmente
-    results = evaluate(
-        dataset=dataset,
-        metrics=[
-            faithfulness,
-            answer_relevancy,
-            context_precision,
-            context_recall
-        ],
-        raise_exceptions=False
-    )
+    # 1. Correr Evaluación
+    # Cada (métrica, fila) es una llamada al juez: como mucho 8 a la vez, y las
+    # ya puntuadas en ejecuciones anteriores salen de la caché en disco.
+    # Un fallo puntual deja NaN (como raise_exceptions=False en evaluate).
+    # Each (metric, row) is one judge call: at most 8 at once, and the ones
+    # scored in previous runs come from the on-disk cache.
+    # A one-off failure leaves NaN (like raise_exceptions=False in evaluate).
+    runner = CachedEvaluationRunner(ragas_score_fn(metrics), cache_path=cache_path,
+                                    max_concurrency=8, namespace="ragas-openai")
+    df = runner.evaluate(data, [metric.name for metric in metrics])
     
     print("\n--- Evaluation Results ---")
-    print(results)
+    print(df[[metric.name for metric in metrics]].mean())
+    print(f"Cache: {runner.stats()}")
     
-    # 3. Exportar resultados
-    df = results.to_pandas()
+    # 2. Exportar resultados
     print("\nTop rows:")
     print(df[['question', 'faithfulness', 'answer_relevancy']].head())
     
@@ -3,36 +3,139 @@ Reranking Concept Demo
 ----------------------
 Simulación de cómo un Reranker reordena resultados para mejorar la relevancia.
 Simulation of how a Reranker reorders results to improve relevance.
+
+Todos los rerankers comparten una API por lotes (`Reranker.rerank`): la query
+se prepara una sola vez, los documentos se puntúan en lotes y solo se
+seleccionan los top-k con un heap, sin ordenar la lista completa.
+All rerankers share a batched API (`Reranker.rerank`): the query is prepared
+once, documents are scored in batches and only the top-k are selected with a
+heap, without sorting the whole list.
 """
 
+import heapq
+import re
+import time
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Any, Optional
+
+import numpy as np
+
+try:
+    from sentence_transformers import CrossEncoder
+except ImportError:
+    CrossEncoder = None
+
+_TOKEN_RE = re.compile(r"\w+")
+
+@lru_cache(maxsize=100_000)
+def _doc_tokens(doc: str) -> frozenset:
+    # Conjunto de tokens precalculado por documento (los candidatos se repiten entre queries)
+    # Precomputed token set per document (candidates repeat across queries)
+    return frozenset(_TOKEN_RE.findall(doc.lower()))
+
+class Reranker(ABC):
+    """
+    Interfaz por lotes. Un backend solo implementa `score_batch` (y, si le
+    sirve, `prepare_query` para procesar la query una vez por petición).
+    Batched interface. A backend only implements `score_batch` (and, if
+    useful, `prepare_query` to process the query once per request).
+    """
+
+    batch_size = 64
+
+    def prepare_query(self, query: str) -> Any:
+        return query
+
+    @abstractmethod
+    def score_batch(self, prepared_query: Any, documents: list[str]) -> np.ndarray:
+        """Un score por documento / One score per document."""
+
+    def rerank(self, query: str, documents: list[str],
+               top_k: Optional[int] = None) -> list[tuple[str, float]]:
+        """
+        Los `top_k` documentos más relevantes (todos si es None), de mayor a
+        menor score; en caso de empate se respeta el orden original.
+        The `top_k` most relevant documents (all if None), highest score first;
+        ties keep the original order.
+        """
+        prepared = self.prepare_query(query)
+        scores = np.empty(len(documents), dtype=np.float64)
+        for start in range(0, len(documents), self.batch_size):
+            batch = documents[start:start + self.batch_size]
+            scores[start:start + len(batch)] = self.score_batch(prepared, batch)
+
+        if top_k is None or top_k >= len(documents):
+            order = sorted(range(len(documents)), key=lambda i: -scores[i])
+        else:
+            # heapq.nlargest es estable: con empates gana el primero
+            # heapq.nlargest is stable: on ties the earliest wins
+            order = heapq.nlargest(top_k, range(len(documents)), key=scores.__getitem__)
+        return [(documents[i], float(scores[i])) for i in order]
+
+class KeywordReranker(Reranker):
+    """
+    Cross-Encoder simulado: 0.1 + 0.3 por cada palabra de la query presente
+    en el documento.
+    Simulated Cross-Encoder: 0.1 + 0.3 for each query word present in the
+    document.
+    """
+
+    def prepare_query(self, query: str) -> list[str]:
+        # Se tokeniza una sola vez por petición / Tokenized once per request
+        return _TOKEN_RE.findall(query.lower())
+
+    def score_batch(self, query_tokens: list[str], documents: list[str]) -> np.ndarray:
+        hits = np.fromiter((sum(token in _doc_tokens(doc) for token in query_tokens)
+                            for doc in documents), dtype=np.float64, count=len(documents))
+        return 0.1 + 0.3 * hits
+
+class _SubstringReranker(Reranker):
+    """
+    Lógica original de `mock_reranker`: 0.1 + 0.3 por cada palabra de la query
+    contenida en el documento como subcadena ("pie" coincide con "pies").
+    Original `mock_reranker` logic: 0.1 + 0.3 for each query word contained
+    in the document as a substring ("pie" matches "pies").
+    """
+
+    def prepare_query(self, query: str) -> list[str]:
+        return query.lower().split()
+
+    def score_batch(self, query_words: list[str], documents: list[str]) -> np.ndarray:
+        scores = np.full(len(documents), 0.1)
+        for word in query_words:
+            # Se suma 0.3 por palabra, como antes (mismos floats) / 0.3 added per word, as before (same floats)
+            scores += [0.3 if word in doc.lower() else 0.0 for doc in documents]
+        return scores
+
+class CrossEncoderReranker(Reranker):
+    """
+    Cross-Encoder real (sentence-transformers) con la misma API por lotes.
+    Real Cross-Encoder (sentence-transformers) behind the same batched API.
+    """
+
+    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+                 batch_size: int = 32):
+        if CrossEncoder is None:
+            raise ImportError("Instala sentence-transformers: pip install sentence-transformers")
+        self.model = CrossEncoder(model_name)
+        self.batch_size = batch_size
+
+    def score_batch(self, query: str, documents: list[str]) -> np.ndarray:
+        return np.asarray(self.model.predict([(query, doc) for doc in documents],
+                                             batch_size=self.batch_size))
+
 def mock_reranker(query: str, documents: list[str]) -> list[tuple[str, float]]:
     """
     Simula un modelo Cross-Encoder que asigna un score a cada par (query, doc).
     Simulates a Cross-Encoder model that assigns a score to each (query, doc) pair.
     """
     print(f"🤖 Reranking {len(documents)} documents for query: '{query}'")
-    
-    scored_docs = []
-    for doc in documents:
-        # Lógica simulada: Si el documento contiene palabras clave de la query, sube el score.
-        # Simulated logic: If doc contains keywords from query, boost score.
-        score = 0.1 # Base score
-        
-        # Simple keyword matching for demo purposes
-        query_words = query.lower().split()
-        for word in query_words:
-            if word in doc.lower():
-                score += 0.3
-                
-        scored_docs.append((doc, score))
-    
-    # Ordenar por score descendente
-    scored_docs.sort(key=lambda x: x[1], reverse=True)
-    return scored_docs
+    return _SubstringReranker().rerank(query, documents)
 
 if __name__ == "__main__":
     query = "apple pie recipe"
-    
+
     # Resultados iniciales de una búsqueda vectorial (pueden ser ruidosos)
     # Initial vector search results (can be noisy)
     retrieved_docs = [
@@ -41,13 +144,22 @@ if __name__ == "__main__":
         "Best Apple Pie Recipe: Flour, apples, sugar...", # El que queremos
         "Apple orchard maintenance guide."
     ]
-    
+
     print("--- Before Reranking (Random Order from Vector DB) ---")
     for doc in retrieved_docs:
         print(f"- {doc}")
-        
+
     reranked = mock_reranker(query, retrieved_docs)
-    
+
     print("\n--- After Reranking (Top 2) ---")
     for doc, score in reranked[:2]:
         print(f"[{score:.2f}] {doc}")
+
+    # Caso real: 200 candidatos por petición, solo interesan los top 5
+    # Real-world case: 200 candidates per request, only the top 5 matter
+    reranker = KeywordReranker()
+    candidates = [f"{doc} (variant {i})" for i in range(50) for doc in retrieved_docs]
+    start = time.perf_counter()
+    top = reranker.rerank(query, candidates, top_k=5)
+    print(f"\n⚡ Reranked {len(candidates)} candidates to top {len(top)} "
+          f"in {(time.perf_counter() - start) * 1000:.2f} ms")
@@ -0,0 +1,174 @@
+"""
+Retrieval Cascade con presupuesto de latencia / Latency-Budgeted Retrieval Cascade
+----------------------------------------------------------------------------------
+Pipeline de dos etapas: el vector store recupera N candidatos (barato) y el
+reranker los reordena hasta k (caro). Cada petición tiene un presupuesto de
+latencia; si queda poco tiempo tras la recuperación se reordenan menos
+candidatos o se omite el reranking, y se registra el camino elegido.
+
+Two-stage pipeline: the vector store retrieves N candidates (cheap) and the
+reranker reorders them down to k (expensive). Every request has a latency
+budget; if little time is left after retrieval, fewer candidates are
+reranked or the rerank is skipped, and the chosen path is recorded.
+
+    Caminos / Paths:
+        "rerank"          N candidatos reordenados / N candidates reranked
+        "rerank_shrunk"   solo los primeros candidatos que caben / only the first candidates that fit
+        "vector_only"     sin reranking, orden vectorial / no rerank, vector order
+"""
+
+import time
+from collections import Counter, deque
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from reranking_demo import KeywordReranker, Reranker
+
+class RetrievalCascade:
+    """
+    Args:
+        store: Vector store de la primera etapa: cualquier objeto con
+            `search(query, k, **kwargs) -> List[str]`, p. ej. el SimpleVectorStore
+            del Módulo 3.1.
+            First-stage vector store: any object with
+            `search(query, k, **kwargs) -> List[str]`, e.g. Module 3.1's
+            SimpleVectorStore.
+        reranker: Segunda etapa (API por lotes de reranking_demo) / Second stage.
+        n_candidates: N máximo que se recupera / Maximum N retrieved.
+        min_candidates: Por debajo de este N no merece la pena reordenar.
+            Below this N reranking is not worth it.
+        budget_ms: Presupuesto por petición por defecto / Default per-request budget.
+        safety: Fracción del tiempo restante que se permite gastar en el reranking.
+            Fraction of the remaining time the rerank may spend.
+        skip_decay: Factor que rebaja la estimación de coste cada vez que se omite
+            el reranking. Sin él, una sola llamada lenta (p. ej. la primera de un
+            Cross-Encoder, en frío) dejaría la cascada en "vector_only" para siempre,
+            porque la estimación solo se corrige cuando se reordena.
+            Factor that lowers the cost estimate every time the rerank is skipped.
+            Without it, a single slow call (e.g. a Cross-Encoder's cold first call)
+            would leave the cascade on "vector_only" forever, since the estimate is
+            only corrected when a rerank runs.
+        search_kwargs: Argumentos extra para `store.search` (p. ej. mode="hybrid").
+            Extra arguments for `store.search` (e.g. mode="hybrid").
+    """
+
+    def __init__(self, store: Any, reranker: Optional[Reranker] = None,
+                 n_candidates: int = 200, min_candidates: int = 20,
+                 budget_ms: float = 50.0, safety: float = 0.8, window: int = 1000,
+                 skip_decay: float = 0.9, **search_kwargs):
+        self.store = store
+        self.reranker = reranker or KeywordReranker()
+        self.n_candidates = n_candidates
+        self.min_candidates = min_candidates
+        self.budget_ms = budget_ms
+        self.safety = safety
+        self.skip_decay = skip_decay
+        self.search_kwargs = search_kwargs
+        # Coste medio del reranker por documento (media móvil exponencial)
+        # Average rerank cost per document (exponential moving average)
+        self.rerank_ms_per_doc: Optional[float] = None
+        self.paths: Counter = Counter()
+        self._latencies: deque = deque(maxlen=window)
+
+    def search(self, query: str, k: int = 5, budget_ms: Optional[float] = None) -> Dict:
+        """
+        Returns:
+            {"results": [...], "path": str, "n_reranked": int,
+             "retrieve_ms": float, "rerank_ms": float, "total_ms": float}
+        """
+        budget_ms = self.budget_ms if budget_ms is None else budget_ms
+        start = time.perf_counter()
+        candidates = self.store.search(query, k=self.n_candidates, **self.search_kwargs)
+        retrieve_ms = (time.perf_counter() - start) * 1000
+
+        n_rerank = self._affordable(budget_ms - retrieve_ms, len(candidates))
+        if not candidates:
+            # Nada que reordenar: no cuenta como "rerank" / Nothing to rerank: does not count as "rerank"
+            path = "vector_only"
+        elif n_rerank >= len(candidates):
+            path = "rerank"
+        elif n_rerank >= max(k, self.min_candidates):
+            # Los candidatos vienen ordenados por similitud: nos quedamos con los mejores
+            # Candidates come sorted by similarity: keep the best ones
+            path = "rerank_shrunk"
+        else:
+            path, n_rerank = "vector_only", 0
+            # Cada omisión abarata la estimación: tarde o temprano un lote pequeño
+            # vuelve a caber y mide el coste real
+            # Each skip lowers the estimate: sooner or later a small batch fits
+            # again and measures the real cost
+            if self.rerank_ms_per_doc is not None:
+                self.rerank_ms_per_doc *= self.skip_decay
+
+        rerank_ms = 0.0
+        results = candidates[:k]
+        if n_rerank:
+            rerank_start = time.perf_counter()
+            reranked = self.reranker.rerank(query, candidates[:n_rerank], top_k=k)
+            rerank_ms = (time.perf_counter() - rerank_start) * 1000
+            results = [doc for doc, _ in reranked]
+            self._observe(rerank_ms / n_rerank)
+
+        total_ms = (time.perf_counter() - start) * 1000
+        self.paths[path] += 1
+        self._latencies.append(total_ms)
+        return {"results": results, "path": path, "n_reranked": n_rerank,
+                "retrieve_ms": retrieve_ms, "rerank_ms": rerank_ms, "total_ms": total_ms}
+
+    def _affordable(self, remaining_ms: float, n: int) -> int:
+        # Cuántos candidatos caben en el tiempo restante / How many candidates fit in the remaining time
+        if self.rerank_ms_per_doc is None:
+            return n  # Sin medidas aún: primera petición completa / No measurements yet: full first request
+        if remaining_ms <= 0:
+            return 0
+        return min(n, int(self.safety * remaining_ms / max(self.rerank_ms_per_doc, 1e-6)))
+
+    def _observe(self, ms_per_doc: float, alpha: float = 0.2):
+        if self.rerank_ms_per_doc is None:
+            self.rerank_ms_per_doc = ms_per_doc
+        else:
+            self.rerank_ms_per_doc += alpha * (ms_per_doc - self.rerank_ms_per_doc)
+
+    def stats(self) -> Dict:
+        """Caminos elegidos y latencia p50/p99 recientes / Chosen paths and recent p50/p99 latency."""
+        latencies = np.array(self._latencies) if self._latencies else np.zeros(1)
+        p50, p99 = np.percentile(latencies, [50, 99])
+        return {"paths": dict(self.paths), "p50_ms": float(p50), "p99_ms": float(p99)}
+
+if __name__ == "__main__":
+    class NoisyVectorStore:
+        """
+        Primera etapa simulada: devuelve los documentos en un orden vectorial
+        fijo y ruidoso (como en reranking_demo.py, lo parecido a "apple" o
+        "pie" sale antes que la receta).
+        Simulated first stage: returns documents in a fixed, noisy vector
+        order (as in reranking_demo.py, whatever looks like "apple" or "pie"
+        comes before the recipe).
+        """
+
+        def __init__(self, documents: List[str]):
+            self.documents = documents
+
+        def search(self, query: str, k: int = 2, **kwargs) -> List[str]:
+            return self.documents[:k]
+
+    class SlowReranker(KeywordReranker):
+        # Simula un Cross-Encoder: ~0.2 ms por documento / Simulates a Cross-Encoder: ~0.2 ms per document
+        def score_batch(self, query_tokens, documents):
+            time.sleep(0.0002 * len(documents))
+            return super().score_batch(query_tokens, documents)
+
+    topics = ["Apple Inc. reported record profits", "The history of pies in England",
+              "Apple orchard maintenance guide", "Best apple pie recipe: flour, apples, sugar"]
+    store = NoisyVectorStore([f"{topics[i % len(topics)]} (doc {i})" for i in range(2000)])
+    print(f"🔎 Vector order: {store.search('apple pie recipe', k=1)[0]}")
+    cascade = RetrievalCascade(store, SlowReranker(), n_candidates=200)
+
+    query = "apple pie recipe"
+    for budget_ms in (100.0, 100.0, 25.0, 5.0):
+        response = cascade.search(query, k=3, budget_ms=budget_ms)
+        print(f"⏱️  budget {budget_ms:>5.1f} ms -> {response['path']:<14} "
+              f"reranked {response['n_reranked']:>3}  total {response['total_ms']:6.2f} ms")
+        print(f"    {response['results'][0]}")
+    print(f"\n📊 {cascade.stats()}")
@@ -0,0 +1,163 @@
+"""
+Offline Retrieval Metrics
+-------------------------
+Métricas de recuperación sin LLM juez, calculadas con NumPy sobre todo el
+dataset a la vez. Sirven como filtro barato (p. ej. en CI) antes de las
+métricas caras de Ragas.
+Retrieval metrics without an LLM judge, computed with NumPy over the whole
+dataset at once. They work as a cheap gate (e.g. in CI) before the
+expensive Ragas metrics.
+
+La relevancia de cada contexto es el solapamiento de tokens con `ground_truth`
+(fracción de tokens del ground truth que aparecen en el contexto).
+Each context's relevance is its token overlap with `ground_truth` (fraction
+of ground-truth tokens that appear in the context).
+
+    hit_rate           algún contexto relevante en el top-k / any relevant context in the top-k
+    recall             tokens del ground truth cubiertos por el top-k / ground-truth tokens covered by the top-k
+    mrr                1 / posición del primer relevante / 1 / rank of the first relevant context
+    ndcg               DCG de los tokens del ground truth que aporta cada posición, frente
+                       al ideal: todo el ground truth en la posición 1 / DCG of the ground-truth
+                       tokens each rank adds, against the ideal: the whole ground truth at rank 1
+    context_precision  precisión media ponderada por posición (como Ragas) / rank-weighted mean precision (like Ragas)
+"""
+
+import time
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+METRICS = ["hit_rate", "recall", "mrr", "ndcg", "context_precision"]
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has in is it its of on or that the this to was "
+    "were will with".split())
+
+def _tokens(texts: pd.Series):
+    """
+    (fila del texto, token) por cada token sin stopwords / (text row, token) for every non-stopword token.
+    """
+    tokens = texts.reset_index(drop=True).str.lower().str.findall(r"\w+").explode().dropna()
+    tokens = tokens[~tokens.isin(_STOPWORDS)]
+    return tokens.index.to_numpy().astype(np.int64), tokens.to_numpy()
+
+def _sorted_unique(keys: np.ndarray) -> np.ndarray:
+    # Ordenar + comparar vecinos: más rápido que np.unique para int64 grandes
+    # Sort + compare neighbours: faster than np.unique for large int64 arrays
+    keys = np.sort(keys)
+    return keys[np.concatenate(([True], keys[1:] != keys[:-1]))] if len(keys) else keys
+
+def retrieval_metrics(data: Dict[str, list], k: int = 5,
+                      relevance_threshold: float = 0.5) -> pd.DataFrame:
+    """
+    Devuelve un DataFrame con la forma de `results.to_pandas()` de Ragas: las
+    columnas de `data` más una columna por métrica de `METRICS`.
+    Returns a DataFrame shaped like Ragas' `results.to_pandas()`: the `data`
+    columns plus one column per metric in `METRICS`.
+
+    Args:
+        k: Contextos considerados por pregunta / Contexts considered per question.
+        relevance_threshold: Solapamiento mínimo para considerar un contexto relevante.
+            Minimum overlap for a context to count as relevant.
+    """
+    df = pd.DataFrame(data)
+    n = len(df)
+
+    # Una fila por (pregunta, posición) con los k primeros contextos
+    # One row per (question, rank) with the first k contexts
+    contexts = df["contexts"].explode()
+    contexts = contexts[contexts.groupby(level=0).cumcount() < k].dropna()
+    ranks = contexts.groupby(level=0).cumcount().to_numpy()
+    slots = contexts.index.to_numpy() * k + ranks
+
+    gt_rows, gt_tokens = _tokens(df["ground_truth"].fillna(""))
+    ctx_rows, ctx_tokens = _tokens(contexts)
+    ctx_slots = slots[ctx_rows]
+
+    # Todos los tokens a enteros con un único vocabulario; cada par (fila, token)
+    # se codifica como un único int64 y se deduplica ordenando
+    # All tokens to integers with one vocabulary; every (row, token) pair is
+    # encoded as a single int64 and deduplicated by sorting
+    codes, vocabulary = pd.factorize(np.concatenate((gt_tokens, ctx_tokens)))
+    vocab_size = len(vocabulary) + 1
+    gt_keys = _sorted_unique(gt_rows * vocab_size + codes[:len(gt_tokens)])
+    ctx_keys = _sorted_unique(ctx_slots * vocab_size + codes[len(gt_tokens):])
+    n_gt = np.bincount(gt_keys // vocab_size, minlength=n).astype(np.float64)
+
+    # Solapamiento por contexto: tokens del ground truth presentes en él
+    # Per-context overlap: ground-truth tokens present in it
+    ctx_slots = ctx_keys // vocab_size
+    row_keys = (ctx_slots // k) * vocab_size + ctx_keys % vocab_size
+    in_gt = np.isin(row_keys, gt_keys)
+    matches = np.bincount(ctx_slots[in_gt], minlength=n * k).reshape(n, k)
+    relevance = np.divide(matches, n_gt[:, None], out=np.zeros((n, k)), where=n_gt[:, None] > 0)
+    relevant = relevance >= relevance_threshold
+
+    # Recall: tokens del ground truth cubiertos por la unión del top-k.
+    # ctx_keys va ordenado por posición, así que tras un orden estable por token
+    # la primera aparición de cada token es la posición que lo aporta.
+    # Recall: ground-truth tokens covered by the union of the top-k.
+    # ctx_keys is sorted by rank, so after a stable sort by token the first
+    # occurrence of each token is the rank that contributes it.
+    gt_row_keys, gt_slots = row_keys[in_gt], ctx_slots[in_gt]
+    order = np.argsort(gt_row_keys, kind="stable")
+    gt_row_keys, gt_slots = gt_row_keys[order], gt_slots[order]
+    first = np.concatenate(([True], gt_row_keys[1:] != gt_row_keys[:-1]))[:len(gt_row_keys)]
+    covered_per_row = np.bincount(gt_row_keys[first] // vocab_size, minlength=n)
+    recall = np.divide(covered_per_row, n_gt, out=np.zeros(n), where=n_gt > 0)
+
+    positions = np.arange(1, k + 1)
+    any_relevant = relevant.any(axis=1)
+    mrr = np.where(any_relevant, 1.0 / (relevant.argmax(axis=1) + 1), 0.0)
+
+    discounts = 1.0 / np.log2(positions + 1)
+    # Ganancia de cada posición: fracción del ground truth que aún no cubrían
+    # las anteriores (las ganancias suman el recall, nunca más de 1). El ideal
+    # depende del ground truth y no de lo recuperado: todo en la posición 1,
+    # IDCG = 1. Normalizar con los contextos recuperados daría 1.0 a cualquier
+    # ranking de contextos irrelevantes.
+    # Each rank's gain: fraction of the ground truth the previous ranks did not
+    # cover yet (gains add up to recall, never above 1). The ideal depends on
+    # the ground truth, not on what was retrieved: all of it at rank 1,
+    # IDCG = 1. Normalising with the retrieved contexts would give 1.0 to any
+    # ranking of irrelevant contexts.
+    new_matches = np.bincount(gt_slots[first], minlength=n * k).reshape(n, k)
+    gain = np.divide(new_matches, n_gt[:, None], out=np.zeros((n, k)), where=n_gt[:, None] > 0)
+    ndcg = (gain * discounts).sum(axis=1)
+
+    precision_at = np.cumsum(relevant, axis=1) / positions
+    n_relevant = relevant.sum(axis=1)
+    context_precision = np.divide((precision_at * relevant).sum(axis=1), n_relevant,
+                                  out=np.zeros(n), where=n_relevant > 0)
+
+    return df.assign(hit_rate=any_relevant.astype(np.float64), recall=recall, mrr=mrr,
+                     ndcg=ndcg, context_precision=context_precision)
+
+def check_gate(df: pd.DataFrame, thresholds: Dict[str, float]) -> List[str]:
+    """
+    Métricas cuya media queda por debajo de su umbral (lista vacía = gate superado).
+    Metrics whose mean falls below their threshold (empty list = gate passed).
+    """
+    return [metric for metric, minimum in thresholds.items() if df[metric].mean() < minimum]
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    n = 100_000
+    facts = [f"fact {i} about topic {i % 97}" for i in range(1000)]
+    ground_truth = [facts[i] for i in rng.integers(0, len(facts), n)]
+    # El contexto correcto aparece en una posición aleatoria (o no aparece)
+    # The right context shows up at a random rank (or not at all)
+    contexts = [[facts[j] for j in rng.integers(0, len(facts), 5)] for _ in range(n)]
+    for row, position in enumerate(rng.integers(0, 7, n)):
+        if position < 5:
+            contexts[row][position] = ground_truth[row]
+    data = {"question": [f"Question {i}?" for i in range(n)], "answer": [""] * n,
+            "contexts": contexts, "ground_truth": ground_truth}
+
+    start = time.perf_counter()
+    df = retrieval_metrics(data, k=5, relevance_threshold=0.9)
+    print(f"📏 {n} rows in {time.perf_counter() - start:.2f}s")
+    print(df[METRICS].mean().round(3).to_string())
+    failed = check_gate(df, {"hit_rate": 0.6, "mrr": 0.3})
+    print("✅ Gate passed" if not failed else f"❌ Gate failed: {failed}")
@@ -5,7 +5,12 @@ Demostración de un patrón de validación "Input/Output Guard" simple sin libre
 Demonstration of a simple "Input/Output Guard" validation pattern without heavy libraries.
 """
 
+import hashlib
+import json
 import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
 from openai import OpenAI
 
 # Definimos tópicos prohibidos
@@ -13,6 +18,53 @@ FORBIDDEN_TOPICS = ["politics", "hacking", "medical advice"]
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
+# Single flight para hilos, con la misma API que `SingleFlight` del Módulo 2.4
+# (single_flight.py, que además cubre asyncio): las peticiones idénticas
+# simultáneas comparten una llamada.
+# Single flight for threads, with the same API as Module 2.4's `SingleFlight`
+# (single_flight.py, which also covers asyncio): identical concurrent requests
+# share one call.
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self.upstream_calls = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.upstream_calls += 1
+            else:
+                self.coalesced += 1
+        if leader:
+            try:
+                future.set_result(fn())
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                # KeyboardInterrupt y similares: los que esperan no se quedan colgados
+                # KeyboardInterrupt and the like: waiters are not left hanging
+                future.cancel()
+                with self._lock:
+                    del self._calls[key]
+        return future.result()
+
+    def stats(self) -> Dict[str, int]:
+        return {"upstream_calls": self.upstream_calls, "coalesced": self.coalesced,
+                "in_flight": len(self._calls)}
+
+flight = SingleFlight()
+
+def create_chat_completion(client, **params):
+    # Hash canónico de (modelo, mensajes, parámetros) / Canonical hash of (model, messages, params)
+    payload = json.dumps(params, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    key = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return flight.do(key, lambda: client.chat.completions.create(**params))
+
 class SafetyGuard:
     @staticmethod
     def validate_input(user_input: str) -> bool:
@@ -47,7 +99,10 @@ def chat_safe(user_input: str):
 
     # 2. Call Model
     try:
-        response = client.chat.completions.create(
+        # La misma pregunta repetida a la vez sale en una sola llamada
+        # The same question repeated at once goes out as a single call
+        response = create_chat_completion(
+            client,
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are a helpful assistant. Do not discuss politics or hacking."},
@@ -74,3 +129,9 @@ if __name__ == "__main__":
         
         # Unsafe interaction
         chat_safe("Tell me how to start hacking wifi networks.")
+
+        # Pregunta popular: 5 copias a la vez, una sola llamada a la API
+        # Popular question: 5 copies at once, a single API call
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            list(pool.map(chat_safe, ["What are your opening hours?"] * 5))
+        print(f"\n📊 Single flight: {flight.stats()['coalesced']} requests coalesced | {flight.stats()}")